@@ -1,10 +1,18 @@
 import os
+import hashlib
+import tempfile
 import pandas as pd
 import logging
 import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from werkzeug.utils import secure_filename
-from models import db, Student, UploadedFile, ChatLog
+from sqlalchemy.exc import IntegrityError
+from models import db, Student, UploadedFile, StoredFile, ChatLog, StudentInsight
+from analytics import cohort_analytics
+from cache import cache
+from http_cache import conditional_get
+from retention import archived_chat_counts, search_archived_logs
+from usage import usage_report
 from functools import wraps
 
 # Initialize logging
@@ -13,6 +21,9 @@ logger = logging.getLogger(__name__)
 # Create blueprint
 admin_bp = Blueprint('admin', __name__)
 
+# Read uploads in 1 MB chunks while hashing them
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 # Admin required decorator
 def admin_required(f):
     @wraps(f)
@@ -26,6 +37,21 @@ def admin_required(f):
 @admin_bp.route('/admin/dashboard')
 @admin_required
 def dashboard():
+    stats = get_dashboard_stats()
+    
+    return render_template('admin.html', 
+                           total_students=stats['total_students'],
+                           total_uploads=stats['total_uploads'],
+                           total_chats=stats['total_chats'],
+                           chart_labels=stats['chart_labels'],
+                           chart_data=stats['chart_data'])
+
+def get_dashboard_stats():
+    """Dashboard statistics, cached briefly and shared by all workers"""
+    return cache.get_or_set('stats', 'dashboard', compute_dashboard_stats,
+                            ttl=current_app.config['STATS_CACHE_TTL'])
+
+def compute_dashboard_stats():
     # Get statistics for the dashboard
     total_students = db.session.query(Student).count()
     total_uploads = db.session.query(UploadedFile).count()
@@ -41,16 +67,25 @@ def dashboard():
         day = chat.timestamp.strftime('%Y-%m-%d')
         chat_data[day] = chat_data.get(day, 0) + 1
     
-    # Format for chart
-    chart_labels = list(chat_data.keys())
-    chart_data = list(chat_data.values())
+    # Archived logs still count towards the totals
+    archived_by_type, archived_by_day = archived_chat_counts()
+    for day, count in archived_by_day.items():
+        if day >= seven_days_ago.strftime('%Y-%m-%d'):
+            chat_data[day] = chat_data.get(day, 0) + count
+    chat_data = dict(sorted(chat_data.items(), reverse=True))
     
-    return render_template('admin.html', 
-                           total_students=total_students,
-                           total_uploads=total_uploads,
-                           total_chats=total_chats,
-                           chart_labels=chart_labels,
-                           chart_data=chart_data)
+    return {
+        'total_students': total_students,
+        'total_uploads': total_uploads,
+        'total_chats': total_chats + sum(archived_by_type.values()),
+        'csv_files': db.session.query(UploadedFile).filter(UploadedFile.file_type == 'csv').count(),
+        'pdf_files': db.session.query(UploadedFile).filter(UploadedFile.file_type == 'pdf').count(),
+        'student_chats': db.session.query(ChatLog).filter(ChatLog.user_type == 'student').count() + archived_by_type['student'],
+        'admin_chats': db.session.query(ChatLog).filter(ChatLog.user_type == 'admin').count() + archived_by_type['admin'],
+        # Format for chart
+        'chart_labels': list(chat_data.keys()),
+        'chart_data': list(chat_data.values())
+    }
 
 @admin_bp.route('/admin/upload', methods=['GET', 'POST'])
 @admin_required
@@ -81,33 +116,41 @@ def upload():
                 return redirect(request.url)
                 
             filename = secure_filename(file.filename)
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
             
             # Determine file type
             file_extension = filename.rsplit('.', 1)[1].lower()
             
-            # Create record in database
+            # Store the content by hash; identical content is only kept once
+            stored_file, is_duplicate = store_upload(file, file_extension)
+            
+            # Create record in database, keeping the original name as metadata
             uploaded_file = UploadedFile()
             uploaded_file.filename = filename
-            uploaded_file.file_path = file_path
+            uploaded_file.file_path = stored_file.file_path
             uploaded_file.file_type = file_extension
             uploaded_file.uploaded_by = session['user_id']
+            uploaded_file.content_hash = stored_file.content_hash
             db.session.add(uploaded_file)
+            db.session.commit()
+            
+            if is_duplicate:
+                flash('This file has the same content as an earlier upload, so the existing data was reused', 'info')
             
             # If it's a CSV, check if it has student data and import
-            if file_extension == 'csv':
+            if file_extension == 'csv' and stored_file.imported_at is None:
                 try:
-                    import_student_data(file_path)
+                    import_student_data(stored_file.file_path)
+                    stored_file.imported_at = datetime.datetime.utcnow()
+                    db.session.commit()
                 except Exception as e:
                     logger.error(f"Error importing student data: {str(e)}")
                     flash(f'File uploaded but there was an error importing student data: {str(e)}', 'warning')
             
-            db.session.commit()
             flash('File uploaded successfully', 'success')
             return redirect(url_for('admin.upload'))
             
         except Exception as e:
+            db.session.rollback()
             logger.error(f"File upload error: {str(e)}")
             flash(f'Error uploading file: {str(e)}', 'danger')
             return redirect(request.url)
@@ -118,6 +161,7 @@ def upload():
 
 @admin_bp.route('/admin/students', methods=['GET'])
 @admin_required
+@conditional_get
 def list_students():
     students = db.session.query(Student).all()
     return jsonify([{
@@ -139,6 +183,7 @@ def delete_student(student_id):
         return jsonify({'success': False, 'message': 'Student not found'}), 404
         
     try:
+        db.session.query(StudentInsight).filter(StudentInsight.student_id == student.id).delete()
         db.session.delete(student)
         db.session.commit()
         return jsonify({'success': True, 'message': f'Student {student.name} deleted successfully'})
@@ -149,6 +194,7 @@ def delete_student(student_id):
 
 @admin_bp.route('/admin/chatlogs', methods=['GET'])
 @admin_required
+@conditional_get
 def get_chat_logs():
     logs = db.session.query(ChatLog).order_by(ChatLog.timestamp.desc()).all()
     
@@ -166,9 +212,101 @@ def get_chat_logs():
     ]
     return jsonify(result)
 
+@admin_bp.route('/admin/chatlogs/archive', methods=['GET'])
+@admin_required
+@conditional_get
+def search_chat_log_archive():
+    """Search archived chat logs by text, date range (YYYY-MM-DD), user type and user id"""
+    try:
+        start = datetime.datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else None
+        end = datetime.datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else None
+        user_id = int(request.args['user_id']) if request.args.get('user_id') else None
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates; user_id and limit must be numbers'}), 400
+    
+    results = search_archived_logs(
+        current_app.config['CHATLOG_ARCHIVE_FOLDER'], text=request.args.get('q'), start=start, end=end,
+        user_type=request.args.get('user_type'), user_id=user_id, limit=limit
+    )
+    return jsonify(results)
+
+@admin_bp.route('/admin/usage', methods=['GET'])
+@admin_required
+@conditional_get
+def generation_usage():
+    """Gemini requests, tokens and latency per day and for the heaviest users"""
+    try:
+        days = min(max(int(request.args.get('days', 7)), 1), 366)
+    except ValueError:
+        return jsonify({'error': 'days must be a number'}), 400
+    return jsonify(usage_report(days))
+
+@admin_bp.route('/admin/analytics', methods=['GET'])
+@admin_required
+@conditional_get
+def analytics():
+    return jsonify(cohort_analytics.report())
+
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
+def store_upload(file, file_extension):
+    """Save an uploaded file under the SHA-256 hash of its content.
+
+    Returns the StoredFile for the content and whether that content had
+    already been uploaded before.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    digest = hashlib.sha256()
+    size = 0
+    
+    # Hash while streaming to a temporary file so large uploads are read once
+    fd, temp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                temp_file.write(chunk)
+                size += len(chunk)
+        
+        content_hash = digest.hexdigest()
+        stored_file = db.session.query(StoredFile).filter(StoredFile.content_hash == content_hash).first()
+        if stored_file and os.path.exists(stored_file.file_path):
+            os.remove(temp_path)
+            return stored_file, True
+        
+        file_dir = os.path.join(upload_folder, content_hash[:2])
+        os.makedirs(file_dir, exist_ok=True)
+        file_path = os.path.join(file_dir, f"{content_hash}.{file_extension}")
+        os.replace(temp_path, file_path)
+        
+        if stored_file is not None:
+            # The record survived but the file went missing; restore it
+            stored_file.extracted_text = None
+            stored_file.file_path = file_path
+            stored_file.size = size
+            return stored_file, False
+        
+        stored_file = StoredFile()
+        stored_file.content_hash = content_hash
+        stored_file.file_type = file_extension
+        stored_file.file_path = file_path
+        stored_file.size = size
+        db.session.add(stored_file)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another admin uploaded the same content at the same time and saved it first
+            db.session.rollback()
+            stored_file = db.session.query(StoredFile).filter(StoredFile.content_hash == content_hash).one()
+            return stored_file, True
+        return stored_file, False
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
 def import_student_data(file_path):
     """Import student data from CSV file"""
     try:
@@ -0,0 +1,270 @@
+import logging
+import threading
+import warnings
+import numpy as np
+from models import db, Student
+from cache import cache
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+SEMESTER_COLUMNS = ['sem1', 'sem2', 'sem3', 'sem4', 'sem5', 'sem6']
+PERCENTILES = [10, 25, 50, 75, 90]
+
+# At-risk thresholds
+LOW_ATTENDANCE_THRESHOLD = 0.7  # fraction of days present
+FALLING_GPA_SLOPE = -0.25  # GPA points lost per semester
+MAX_AT_RISK_LISTED = 10
+
+
+def _clean(value, digits=2):
+    """Convert NumPy scalars to JSON-safe Python values"""
+    if value is None:
+        return None
+    value = float(value)
+    if np.isnan(value):
+        return None
+    return round(value, digits)
+
+
+class CohortAnalytics:
+    """Columnar in-memory snapshot of the numeric Student columns.
+
+    Statistics are computed with vectorized NumPy operations instead of
+    looping over ORM objects. The snapshot is loaded lazily and reloaded
+    whenever the shared cache reports a new version of the students
+    namespace, so every worker sees student changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded_version = None
+        self._set_empty()
+
+    def _set_empty(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.roll_nos = np.empty(0, dtype=object)
+        self.names = np.empty(0, dtype=object)
+        self.majors = np.empty(0, dtype=object)
+        self.gpa = np.empty(0)
+        self.attendance = np.empty(0)
+        self.semesters = np.empty((0, len(SEMESTER_COLUMNS)))
+        self.major_names = np.empty(0, dtype=object)
+        self.major_index = np.empty(0, dtype=np.int64)
+
+    def _ensure_loaded(self):
+        # The students namespace version is bumped by every worker that commits a student change
+        version = cache.version('students')
+        if version != self._loaded_version:
+            self._load()
+            self._loaded_version = version
+
+    def _load(self):
+        columns = [Student.id, Student.roll_no, Student.name, Student.major,
+                   Student.current_gpa, Student.days_present, Student.total_days]
+        columns += [getattr(Student, column) for column in SEMESTER_COLUMNS]
+        rows = db.session.query(*columns).all()
+
+        if not rows:
+            self._set_empty()
+            return
+
+        # Transpose rows into one array per column
+        data = list(zip(*rows))
+        self.ids = np.array(data[0], dtype=np.int64)
+        self.roll_nos = np.array(data[1], dtype=object)
+        self.names = np.array(data[2], dtype=object)
+        self.majors = np.array([major or 'Unknown' for major in data[3]], dtype=object)
+        self.gpa = np.array(data[4], dtype=float)
+
+        days_present = np.array(data[5], dtype=float)
+        total_days = np.array(data[6], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.attendance = np.where(total_days > 0, days_present / total_days, np.nan)
+
+        self.semesters = np.array(data[7:], dtype=float).T
+        self.major_names, self.major_index = np.unique(self.majors, return_inverse=True)
+        logger.info(f"Loaded cohort analytics for {len(self.ids)} students")
+
+    def gpa_slopes(self):
+        """Least-squares GPA change per semester for every student, ignoring missing semesters"""
+        present = ~np.isnan(self.semesters)
+        counts = present.sum(axis=1)
+        x = np.arange(len(SEMESTER_COLUMNS), dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_mean = (present * x).sum(axis=1) / counts
+            y_mean = np.nansum(self.semesters, axis=1) / counts
+            x_dev = np.where(present, x - x_mean[:, None], 0.0)
+            y_dev = np.where(present, self.semesters - y_mean[:, None], 0.0)
+            slopes = (x_dev * y_dev).sum(axis=1) / (x_dev ** 2).sum(axis=1)
+        return np.where(counts >= 2, slopes, np.nan)
+
+    def student_standing(self):
+        """Per-student GPA trend, attendance and GPA percentile within their major"""
+        with self._lock:
+            self._ensure_loaded()
+            major_percentile = np.full(len(self.ids), np.nan)
+            major_gpa_mean = np.full(len(self.ids), np.nan)
+            for index in range(len(self.major_names)):
+                in_major = self.major_index == index
+                with_gpa = in_major & np.isfinite(self.gpa)
+                peers = np.sort(self.gpa[with_gpa])
+                if peers.size == 0:
+                    continue
+                # Share of the major with a GPA at or below the student's
+                major_percentile[with_gpa] = np.searchsorted(peers, self.gpa[with_gpa], side='right') / peers.size * 100
+                major_gpa_mean[in_major] = peers.mean()
+
+            return {
+                'ids': self.ids.copy(),
+                'majors': self.majors.copy(),
+                'gpa': self.gpa.copy(),
+                'attendance': self.attendance.copy(),
+                'semesters': self.semesters.copy(),
+                'gpa_slope': self.gpa_slopes(),
+                'major_percentile': major_percentile,
+                'major_gpa_mean': major_gpa_mean,
+            }
+
+    def major_distributions(self):
+        result = {}
+        for index, major in enumerate(self.major_names):
+            mask = self.major_index == index
+            gpa = self.gpa[mask]
+            attendance = self.attendance[mask]
+            result[str(major)] = {
+                'students': int(mask.sum()),
+                'gpa_mean': _clean(np.nanmean(gpa)) if np.isfinite(gpa).any() else None,
+                'gpa_percentiles': self._percentiles(gpa),
+                'attendance_mean': _clean(np.nanmean(attendance) * 100) if np.isfinite(attendance).any() else None,
+                'attendance_percentiles': self._percentiles(attendance * 100),
+            }
+        return result
+
+    @staticmethod
+    def _percentiles(values):
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return {}
+        return {f"p{p}": _clean(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+    def semester_trends(self):
+        if self.semesters.shape[0] == 0:
+            return {'cohort_means': {}, 'mean_change': {}, 'by_major': {}}
+
+        # Semesters with no results at all produce NaN means, which is expected
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            cohort_means = np.nanmean(self.semesters, axis=0)
+            mean_change = np.nanmean(np.diff(self.semesters, axis=1), axis=0)
+            by_major = {
+                str(major): [_clean(v) for v in np.nanmean(self.semesters[self.major_index == index], axis=0)]
+                for index, major in enumerate(self.major_names)
+            }
+
+        return {
+            'cohort_means': {column: _clean(v) for column, v in zip(SEMESTER_COLUMNS, cohort_means)},
+            'mean_change': {
+                f"{SEMESTER_COLUMNS[i]}->{SEMESTER_COLUMNS[i + 1]}": _clean(v)
+                for i, v in enumerate(mean_change)
+            },
+            'by_major': by_major,
+        }
+
+    def at_risk(self):
+        slopes = self.gpa_slopes()
+        falling_gpa = slopes <= FALLING_GPA_SLOPE
+        low_attendance = self.attendance < LOW_ATTENDANCE_THRESHOLD
+        flagged = np.flatnonzero(falling_gpa | low_attendance)
+
+        # Steepest GPA declines first
+        order = flagged[np.argsort(np.nan_to_num(slopes[flagged], nan=0.0))]
+        students = [
+            {
+                'id': int(self.ids[i]),
+                'roll_no': self.roll_nos[i],
+                'name': self.names[i],
+                'major': self.majors[i],
+                'current_gpa': _clean(self.gpa[i]),
+                'attendance_percentage': _clean(self.attendance[i] * 100),
+                'gpa_slope': _clean(slopes[i]),
+                'falling_gpa': bool(falling_gpa[i]),
+                'low_attendance': bool(low_attendance[i]),
+            }
+            for i in order
+        ]
+        return {
+            'falling_gpa_count': int(falling_gpa.sum()),
+            'low_attendance_count': int(low_attendance.sum()),
+            'total': len(students),
+            'students': students,
+        }
+
+    def correlations(self):
+        labels = ['current_gpa', 'attendance'] + SEMESTER_COLUMNS
+        matrix = np.column_stack([self.gpa, self.attendance, self.semesters]) if len(self.ids) else np.empty((0, len(labels)))
+        complete = matrix[np.isfinite(matrix).all(axis=1)]
+        if complete.shape[0] < 2:
+            return {'labels': labels, 'matrix': [], 'attendance_vs_gpa': None}
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = np.corrcoef(complete, rowvar=False)
+        return {
+            'labels': labels,
+            'matrix': [[_clean(v, 3) for v in row] for row in corr],
+            'attendance_vs_gpa': _clean(corr[0, 1], 3),
+        }
+
+    def report(self):
+        # Hold the lock so a concurrent reload cannot swap arrays mid-computation
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                'total_students': int(len(self.ids)),
+                'gpa_above_7': int(np.sum(self.gpa > 7)),
+                'majors': self.major_distributions(),
+                'semester_trends': self.semester_trends(),
+                'at_risk': self.at_risk(),
+                'correlations': self.correlations(),
+            }
+
+    def summary_text(self):
+        """Compact plain-text summary suitable for an LLM prompt"""
+        report = self.report()
+        at_risk = report['at_risk']
+        lines = [
+            f"- Total students: {report['total_students']}",
+            f"- Students with attendance below {int(LOW_ATTENDANCE_THRESHOLD * 100)}%: {at_risk['low_attendance_count']}",
+            f"- Students with a falling GPA trend: {at_risk['falling_gpa_count']}",
+            f"- Students with GPA above 7: {report['gpa_above_7']}",
+        ]
+
+        attendance_vs_gpa = report['correlations']['attendance_vs_gpa']
+        if attendance_vs_gpa is not None:
+            lines.append(f"- Correlation between attendance and GPA: {attendance_vs_gpa}")
+
+        cohort_means = report['semester_trends']['cohort_means']
+        if cohort_means:
+            lines.append("- Average result per semester: " + ", ".join(
+                f"{column}: {value}" for column, value in cohort_means.items()))
+
+        for major, stats in report['majors'].items():
+            median_gpa = stats['gpa_percentiles'].get('p50')
+            median_attendance = stats['attendance_percentiles'].get('p50')
+            lines.append(f"- {major}: {stats['students']} students, mean GPA {stats['gpa_mean']}, "
+                         f"median GPA {median_gpa}, median attendance {median_attendance}%")
+
+        if at_risk['students']:
+            lines.append("- Most at-risk students:")
+            for student in at_risk['students'][:MAX_AT_RISK_LISTED]:
+                reasons = []
+                if student['falling_gpa']:
+                    reasons.append(f"GPA falling {student['gpa_slope']} per semester")
+                if student['low_attendance']:
+                    reasons.append(f"attendance {student['attendance_percentage']}%")
+                lines.append(f"  - {student['name']} ({student['roll_no']}, {student['major']}): {', '.join(reasons)}")
+
+        return "\n".join(lines)
+
+
+cohort_analytics = CohortAnalytics()
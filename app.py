@@ -5,6 +5,8 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import timedelta
+from cache import init_cache
+from http_cache import init_http_cache
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -36,9 +38,55 @@ app.config["UPLOAD_FOLDER"] = os.path.join(os.getcwd(), "data", "uploads")
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16 MB max file size
 app.config["ALLOWED_EXTENSIONS"] = {'csv', 'pdf'}
 
+# Configure PDF text extraction
+app.config["PDF_EXTRACTION_WORKERS"] = int(os.environ.get("PDF_EXTRACTION_WORKERS", os.cpu_count() or 2))
+app.config["PDF_PAGE_TIMEOUT"] = int(os.environ.get("PDF_PAGE_TIMEOUT", 10))  # seconds per page
+
+# Configure the cache; "sqlite" is shared by all workers on the host, "memory" is per process
+app.config["CACHE_BACKEND"] = os.environ.get("CACHE_BACKEND", "sqlite")
+app.config["CACHE_PATH"] = os.environ.get("CACHE_PATH", os.path.join(app.instance_path, "cache.sqlite3"))
+app.config["CACHE_MAX_ENTRIES"] = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+app.config["CACHE_DEFAULT_TTL"] = int(os.environ.get("CACHE_DEFAULT_TTL", 3600))  # seconds
+app.config["STATS_CACHE_TTL"] = int(os.environ.get("STATS_CACHE_TTL", 60))  # seconds
+app.config["LLM_CACHE_TTL"] = int(os.environ.get("LLM_CACHE_TTL", 3600))  # seconds
+
+# Configure precomputed student insights
+app.config["INSIGHT_LLM_CONCURRENCY"] = int(os.environ.get("INSIGHT_LLM_CONCURRENCY", 4))
+
+# Configure bulk report generation
+app.config["REPORT_WORKERS"] = int(os.environ.get("REPORT_WORKERS", 4))
+app.config["REPORT_RATE_PER_MINUTE"] = int(os.environ.get("REPORT_RATE_PER_MINUTE", 60))
+
+# Configure streaming exports
+app.config["EXPORT_BATCH_SIZE"] = int(os.environ.get("EXPORT_BATCH_SIZE", 5000))  # rows per batch
+
+# Configure chat log retention; older logs are moved to compressed archive files
+app.config["CHATLOG_RETENTION_DAYS"] = int(os.environ.get("CHATLOG_RETENTION_DAYS", 90))
+app.config["CHATLOG_ARCHIVE_FOLDER"] = os.environ.get("CHATLOG_ARCHIVE_FOLDER", os.path.join(os.getcwd(), "data", "archive", "chatlogs"))
+
+# Configure Gemini budgets; over budget, chats are answered from stored data (0 disables a limit)
+app.config["GEMINI_USER_REQUESTS_PER_MINUTE"] = int(os.environ.get("GEMINI_USER_REQUESTS_PER_MINUTE", 10))
+app.config["GEMINI_GLOBAL_REQUESTS_PER_MINUTE"] = int(os.environ.get("GEMINI_GLOBAL_REQUESTS_PER_MINUTE", 60))
+app.config["GEMINI_USER_DAILY_TOKENS"] = int(os.environ.get("GEMINI_USER_DAILY_TOKENS", 100000))
+app.config["GEMINI_GLOBAL_DAILY_TOKENS"] = int(os.environ.get("GEMINI_GLOBAL_DAILY_TOKENS", 2000000))
+
+# Configure conversation memory: recent turns kept verbatim, older ones summarized
+app.config["CONVERSATION_RECENT_TURNS"] = int(os.environ.get("CONVERSATION_RECENT_TURNS", 4))
+app.config["CONVERSATION_SUMMARY_MAX_CHARS"] = int(os.environ.get("CONVERSATION_SUMMARY_MAX_CHARS", 1500))
+app.config["CONVERSATION_TTL"] = int(app.permanent_session_lifetime.total_seconds())  # seconds
+
+# Configure response compression; smaller bodies are not worth compressing
+app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))  # bytes
+
 # Ensure upload directory exists
 os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
+# Initialize the cache
+init_cache(app)
+
+# Compress responses and serve static files under content-hashed URLs
+init_http_cache(app)
+
 # Initialize the database
 db.init_app(app)
 
@@ -46,6 +94,7 @@ db.init_app(app)
 with app.app_context():
     import models
     db.create_all()
+    models.add_missing_columns()
     
     # Create admin user if not exists
     from models import User, Student
@@ -107,11 +156,21 @@ with app.app_context():
 from login import login_bp
 from chatbot import chatbot_bp
 from admin import admin_bp
+from reports import reports_bp
+from export import export_bp
 
 # Register blueprints
 app.register_blueprint(login_bp)
 app.register_blueprint(chatbot_bp)
 app.register_blueprint(admin_bp)
+app.register_blueprint(reports_bp)
+app.register_blueprint(export_bp)
+
+# Register CLI commands
+from insights import precompute_insights_command
+app.cli.add_command(precompute_insights_command)
+from retention import archive_chatlogs_command
+app.cli.add_command(archive_chatlogs_command)
 
 # Root route
 @app.route('/')
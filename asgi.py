@@ -0,0 +1,146 @@
+"""ASGI entry point serving /api/chat asynchronously.
+
+Run with:
+    gunicorn --bind 0.0.0.0:5000 -k uvicorn.workers.UvicornWorker asgi:app
+
+POST /api/chat is handled natively on the event loop, so a single worker
+can hold hundreds of chats while they wait on Gemini. Every other route
+is passed through to the regular Flask (WSGI) application.
+"""
+import json
+import asyncio
+import logging
+from http.cookies import SimpleCookie
+from itsdangerous import BadSignature
+from a2wsgi import WSGIMiddleware
+from app import app as flask_app
+from http_cache import compress_body
+from conversation import Conversation
+from chatbot import (process_student_query_async, process_admin_query_async, log_chat, remember_turn,
+                     fold_conversation_async)
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+wsgi_app = WSGIMiddleware(flask_app)
+
+
+def load_session(headers):
+    """Decode the signed Flask session cookie from raw ASGI headers"""
+    cookie_name = flask_app.config.get('SESSION_COOKIE_NAME', 'session')
+    for name, value in headers:
+        if name != b'cookie':
+            continue
+        cookie = SimpleCookie()
+        cookie.load(value.decode('latin-1'))
+        if cookie_name not in cookie:
+            continue
+        serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        if serializer is None:
+            return {}
+        try:
+            return serializer.loads(cookie[cookie_name].value,
+                                    max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            return {}
+    return {}
+
+
+async def read_body(receive, limit):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if limit and len(body) > limit:
+            raise ValueError('Request body too large')
+        if not message.get('more_body', False):
+            return body
+
+
+def get_header(headers, name):
+    for key, value in headers:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def send_json(send, status, payload, accept_encoding=None):
+    body, encoding = compress_body(json.dumps(payload).encode('utf-8'), 'application/json',
+                                   accept_encoding, flask_app.config['COMPRESS_MIN_SIZE'])
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('latin-1')),
+        (b'vary', b'Accept-Encoding'),
+    ]
+    if encoding:
+        headers.append((b'content-encoding', encoding.encode('latin-1')))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers,
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def process_chat(scope, receive, send):
+    """Async counterpart of chatbot.process_chat"""
+    session = load_session(scope.get('headers', []))
+    if 'user_type' not in session:
+        await send_json(send, 401, {'error': 'You must be logged in to use the chatbot'})
+        return
+
+    try:
+        data = json.loads(await read_body(receive, flask_app.config.get('MAX_CONTENT_LENGTH')) or b'{}')
+        query = data.get('query', '')
+    except (ValueError, AttributeError):
+        await send_json(send, 400, {'error': 'Invalid request body'})
+        return
+
+    if not query:
+        await send_json(send, 400, {'error': 'Empty query'})
+        return
+
+    user_type = session['user_type']
+    user_id = session['user_id']
+
+    try:
+        # The app context lives in a context variable, so each request task gets its own
+        with flask_app.app_context():
+            # The session cookie is read-only here; sessions without a conversation id share one per user
+            conversation = await asyncio.to_thread(Conversation.load, session)
+
+            if user_type == 'student':
+                response = await process_student_query_async(query, user_id, conversation)
+            else:  # admin
+                response = await process_admin_query_async(query, user_id, conversation)
+
+            # Log the chat
+            await asyncio.to_thread(log_chat, user_type, user_id, query, response)
+            await asyncio.to_thread(remember_turn, conversation, query, response)
+
+        await send_json(send, 200, {'response': response}, get_header(scope.get('headers', []), b'accept-encoding'))
+
+    except Exception as e:
+        logger.error(f"Error processing chat: {str(e)}")
+        await send_json(send, 500, {'error': 'An error occurred while processing your query. Please try a different question.'})
+        return
+
+    # Summarize older turns once the reply is out, so the extra generation never delays it
+    with flask_app.app_context():
+        await fold_conversation_async(conversation, (user_type, user_id))
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] == 'http' and scope['path'] == '/api/chat' and scope['method'] == 'POST':
+        await process_chat(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
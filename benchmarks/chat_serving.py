@@ -0,0 +1,127 @@
+"""Benchmark the sync (WSGI) and async (ASGI) /api/chat serving paths.
+
+Gemini is replaced by a fake model that sleeps for a fixed latency, so the
+numbers show how many chats each mode can hold in flight rather than how
+fast the upstream is. Run from the project root:
+
+    python benchmarks/chat_serving.py --requests 200 --latency 1.0 --sync-workers 4
+
+The sync path is driven by a pool sized like gunicorn's sync workers; the
+async path runs every request concurrently on a single event loop.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+# Use a throwaway database and a private cache so benchmarking never touches real data
+_workdir = tempfile.mkdtemp(prefix='chat-bench-')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(_workdir, 'bench.db')}")
+os.environ.setdefault('CACHE_BACKEND', 'memory')
+# Every benchmark request comes from one admin, so per-user budgets would turn it into a fallback test
+for _budget in ('GEMINI_USER_REQUESTS_PER_MINUTE', 'GEMINI_GLOBAL_REQUESTS_PER_MINUTE',
+                'GEMINI_USER_DAILY_TOKENS', 'GEMINI_GLOBAL_DAILY_TOKENS'):
+    os.environ.setdefault(_budget, '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+import chatbot  # noqa: E402
+from asgi import app as asgi_app  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Stand-in for the Gemini model with a fixed response latency"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        return FakeResponse('benchmark response')
+
+    async def generate_content_async(self, prompt):
+        await asyncio.sleep(self.latency)
+        return FakeResponse('benchmark response')
+
+
+def login_cookie():
+    client = app.test_client()
+    client.post('/login', data={'login_type': 'admin', 'email': 'admin@example.com', 'password': 'admin123'})
+    return client.get_cookie(app.config.get('SESSION_COOKIE_NAME', 'session'))
+
+
+def run_sync(total, workers, cookie):
+    def one(i):
+        client = app.test_client()
+        client.set_cookie(cookie.key, cookie.value)
+        started = time.perf_counter()
+        # Unique queries so the response cache never short-circuits generation
+        response = client.post('/api/chat', json={'query': f"benchmark question {i}"}, )
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(one, range(total)))
+    return time.perf_counter() - started, latencies
+
+
+async def run_async(total, cookie):
+    async def one(i):
+        body = f'{{"query": "benchmark question async {i}"}}'.encode('utf-8')
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        status = []
+
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        scope = {
+            'type': 'http', 'method': 'POST', 'path': '/api/chat',
+            'headers': [(b'cookie', f"{cookie.key}={cookie.value}".encode('latin-1')), (b'content-type', b'application/json')],
+        }
+        started = time.perf_counter()
+        await asgi_app(scope, receive, send)
+        assert status == [200], status
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - started, latencies
+
+
+def report(name, elapsed, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<6} {len(latencies)} requests in {elapsed:.2f}s | "
+          f"{len(latencies) / elapsed:.1f} req/s | p50 {statistics.median(latencies):.2f}s | p95 {p95:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=1.0, help='simulated Gemini latency in seconds')
+    parser.add_argument('--sync-workers', type=int, default=4, help='number of sync gunicorn workers to emulate')
+    args = parser.parse_args()
+
+    chatbot.model = FakeModel(args.latency)
+    cookie = login_cookie()
+
+    report('sync', *run_sync(args.requests, args.sync_workers, cookie))
+    report('async', *asyncio.run(run_async(args.requests, cookie)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+# Namespace holding the invalidation counters of every other namespace
+VERSION_NAMESPACE = '__version__'
+
+
+class CacheBackend:
+    """Storage interface shared by all cache backends.
+
+    Keys are (namespace, key) string pairs and values are any picklable
+    object. A networked store only needs to implement these methods.
+    """
+
+    def get(self, namespace, key):
+        """Return the cached value, or None when missing or expired"""
+        raise NotImplementedError
+
+    def set(self, namespace, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+    def delete_namespace(self, namespace):
+        raise NotImplementedError
+
+    def incr(self, namespace, key, amount=1, ttl=None):
+        """Atomically add to an integer counter and return the new value"""
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache, private to the worker that owns it"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[(namespace, key)]
+                return None
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def set(self, namespace, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[(namespace, key)] = (value, expires_at)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+    def delete_namespace(self, namespace):
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == namespace]:
+                del self._entries[entry_key]
+
+    def incr(self, namespace, key, amount=1, ttl=None):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and (entry[1] is None or entry[1] >= time.time()):
+                value, expires_at = entry[0] + amount, entry[1]
+            else:
+                value, expires_at = amount, (time.time() + ttl if ttl else None)
+            self._entries[(namespace, key)] = (value, expires_at)
+            self._entries.move_to_end((namespace, key))
+            return value
+
+
+class SQLiteCache(CacheBackend):
+    """Cache stored in a local SQLite file shared by every worker on the host"""
+
+    # Expired and excess entries are pruned once every this many writes
+    PRUNE_INTERVAL = 200
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entry (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB,
+                    expires_at REAL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_cache_entry_updated_at ON cache_entry (updated_at)")
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Connections must not be shared across forked workers
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, namespace, key):
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache_entry WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return pickle.loads(value)
+
+    def set(self, namespace, key, value, ttl=None):
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO cache_entry (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now + ttl if ttl else None, now)
+        )
+        self._after_write()
+
+    def delete(self, namespace, key):
+        self._connect().execute("DELETE FROM cache_entry WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def delete_namespace(self, namespace):
+        self._connect().execute("DELETE FROM cache_entry WHERE namespace = ?", (namespace,))
+
+    def incr(self, namespace, key, amount=1, ttl=None):
+        now = time.time()
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT value, expires_at FROM cache_entry WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+            if row is not None and (row[1] is None or row[1] >= now):
+                value, expires_at = pickle.loads(row[0]) + amount, row[1]
+            else:
+                value, expires_at = amount, (now + ttl if ttl else None)
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entry (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at, now)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return value
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % self.PRUNE_INTERVAL:
+            return
+        connection = self._connect()
+        connection.execute("DELETE FROM cache_entry WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+        # Evict the least recently written entries beyond the size limit
+        connection.execute("""
+            DELETE FROM cache_entry WHERE namespace != ? AND rowid IN (
+                SELECT rowid FROM cache_entry ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (VERSION_NAMESPACE, self.max_entries))
+
+
+class Cache:
+    """Application-wide cache facade over a swappable backend.
+
+    Backend errors are logged and treated as cache misses so a broken
+    cache never breaks a request.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryCache()
+        self.default_ttl = None
+
+    def configure(self, backend, default_ttl=None):
+        self.backend = backend
+        self.default_ttl = default_ttl
+
+    def get(self, namespace, key, default=None):
+        try:
+            value = self.backend.get(namespace, str(key))
+        except Exception as e:
+            logger.error(f"Cache get failed for {namespace}:{key}: {str(e)}")
+            return default
+        return default if value is None else value
+
+    def set(self, namespace, key, value, ttl=None):
+        try:
+            self.backend.set(namespace, str(key), value, ttl or self.default_ttl)
+        except Exception as e:
+            logger.error(f"Cache set failed for {namespace}:{key}: {str(e)}")
+
+    def delete(self, namespace, key):
+        try:
+            self.backend.delete(namespace, str(key))
+        except Exception as e:
+            logger.error(f"Cache delete failed for {namespace}:{key}: {str(e)}")
+
+    def get_or_set(self, namespace, key, factory, ttl=None):
+        value = self.get(namespace, key)
+        if value is None:
+            value = factory()
+            if value is not None:
+                self.set(namespace, key, value, ttl)
+        return value
+
+    def incr(self, namespace, key, amount=1, ttl=None):
+        try:
+            return self.backend.incr(namespace, str(key), amount, ttl)
+        except Exception as e:
+            logger.error(f"Cache incr failed for {namespace}:{key}: {str(e)}")
+            return None
+
+    def version(self, namespace):
+        """Invalidation counter for a namespace, shared by all workers using the backend"""
+        return self.get(VERSION_NAMESPACE, namespace, 0)
+
+    def invalidate(self, namespace):
+        """Drop every entry in a namespace and bump its version"""
+        try:
+            self.backend.delete_namespace(namespace)
+        except Exception as e:
+            logger.error(f"Cache invalidation failed for {namespace}: {str(e)}")
+        self.incr(VERSION_NAMESPACE, namespace)
+
+
+cache = Cache()
+
+
+def init_cache(app):
+    """Configure the shared cache from the Flask config"""
+    backend_name = app.config.get('CACHE_BACKEND', 'memory')
+    if backend_name == 'sqlite':
+        backend = SQLiteCache(app.config['CACHE_PATH'], max_entries=app.config.get('CACHE_MAX_ENTRIES', 10000))
+    elif backend_name == 'memory':
+        backend = MemoryCache(max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024))
+    else:
+        raise ValueError(f"Unknown cache backend: {backend_name}")
+    cache.configure(backend, default_ttl=app.config.get('CACHE_DEFAULT_TTL'))
+    logger.info(f"Using {backend_name} cache backend")
+
+
+def invalidate_on_commit(model, *namespaces):
+    """Invalidate cache namespaces after any commit that changed rows of a model"""
+
+    @event.listens_for(Session, 'after_flush')
+    def _record_changes(session, flush_context):
+        changed = list(session.new) + list(session.dirty) + list(session.deleted)
+        if any(isinstance(obj, model) for obj in changed):
+            session.info.setdefault('invalidate_namespaces', set()).update(namespaces)
+
+    @event.listens_for(Session, 'after_commit')
+    def _invalidate(session):
+        pending = session.info.pop('invalidate_namespaces', set())
+        for namespace in pending:
+            cache.invalidate(namespace)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _discard(session):
+        session.info.pop('invalidate_namespaces', None)
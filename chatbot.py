@@ -1,13 +1,24 @@
 import os
+import time
+import asyncio
+import hashlib
+import threading
 import pandas as pd
-import pdfplumber
 import logging
 import google.generativeai as genai
 import nltk
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from flask import Blueprint, render_template, request, session, jsonify, current_app, flash, redirect, url_for
-from models import db, Student, ChatLog, UploadedFile
+from models import db, Student, ChatLog, UploadedFile, StoredFile
+from pdf_extraction import extract_pdf_text
+from admin import get_dashboard_stats
+from analytics import cohort_analytics
+from cache import cache
+from singleflight import SingleFlight, AsyncSingleFlight, SharedFlight
+from insights import get_fresh_insight, is_overview_question
+from usage import check_budget, check_user_budget, check_global_budget, record_generation, record_usage
+from conversation import Conversation, start_conversation
 from functools import wraps
 
 # Initialize NLTK components
@@ -62,6 +73,30 @@ except Exception as e:
     logger.error(f"Error initializing Gemini AI model: {str(e)}")
     model = None
 
+# Fallback responses
+STUDENT_NOT_FOUND_MESSAGE = "Sorry, I couldn't find your student record."
+MODEL_UNAVAILABLE_MESSAGE = "I'm sorry, I'm having trouble accessing my knowledge base right now. Please try again later."
+GENERATION_ERROR_MESSAGE = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+INVALID_RESPONSE_MESSAGE = "I'm sorry, I couldn't generate a proper response. Please try a different question."
+BUDGET_EXCEEDED_MESSAGE = "I'm receiving a lot of questions right now. Please try again later."
+FALLBACK_MESSAGES = {MODEL_UNAVAILABLE_MESSAGE, GENERATION_ERROR_MESSAGE, INVALID_RESPONSE_MESSAGE, BUDGET_EXCEEDED_MESSAGE}
+
+# Prefixed to answers built from stored data when a generation budget is exhausted
+BUDGET_NOTICE = ("I'm answering a lot of questions right now, so here is a quick summary from the records. "
+                 "Please ask again later for a detailed answer.")
+
+class DegradedAnswer(str):
+    """An answer served without Gemini because a budget is exhausted"""
+
+# Identical admin prompts in flight at the same time share one generation: first within
+# this worker, then across workers through a lease in the shared cache whose holder
+# leaves the answer in the 'llm' namespace for the others
+admin_generations = SingleFlight()
+admin_generations_async = AsyncSingleFlight()
+admin_generations_shared = SharedFlight(cache, 'inflight', 'llm', lease_ttl=30)
+# Only one request at a time summarizes a conversation
+conversation_folds = SharedFlight(cache, 'inflight', 'conversations', lease_ttl=60)
+
 # Create blueprint
 chatbot_bp = Blueprint('chatbot', __name__)
 
@@ -86,12 +121,12 @@ def chat():
     try:
         # Get student information
         student_id = session.get('user_id')
-        student = db.session.query(Student).filter(Student.id == student_id).first()
+        student = get_student_snapshot(student_id)
         if not student:
             flash('Student information not found. Please login again.', 'danger')
             return redirect(url_for('login.login_page'))
             
-        student_name = student.name if student.name else f"Student {student.serial_no}"
+        student_name = student['name'] if student['name'] else f"Student {student['serial_no']}"
         
         # Get student's chat history
         chat_history = db.session.query(ChatLog).filter(
@@ -112,6 +147,7 @@ def chat():
         return render_template('chat.html', 
                             student_name=student_name,
                             student=student,
+                            insight=get_fresh_insight(student),
                             chat_history=formatted_history)
                             
     except Exception as e:
@@ -150,17 +186,15 @@ def admin_chat():
             })
             
         # Get summary stats for admin dashboard
-        student_count = db.session.query(Student).count()
-        file_count = db.session.query(UploadedFile).count()
-        chat_count = db.session.query(ChatLog).count()
+        dashboard_stats = get_dashboard_stats()
         
         return render_template('admin_chat.html', 
                             admin_email=admin_email,
                             chat_history=formatted_history,
                             stats={
-                                'student_count': student_count,
-                                'file_count': file_count,
-                                'chat_count': chat_count
+                                'student_count': dashboard_stats['total_students'],
+                                'file_count': dashboard_stats['total_uploads'],
+                                'chat_count': dashboard_stats['total_chats']
                             })
     
     except Exception as e:
@@ -183,20 +217,21 @@ def process_chat():
     user_id = session['user_id']
     
     try:
+        # Sessions from before conversation memory start one on their first chat
+        if 'conversation_id' not in session:
+            start_conversation(session)
+        conversation = Conversation.load(session)
+        
         # Process the query and get response
         if user_type == 'student':
-            response = process_student_query(query, user_id)
+            response = process_student_query(query, user_id, conversation)
         else:  # admin
-            response = process_admin_query(query)
+            response = process_admin_query(query, user_id, conversation)
             
         # Log the chat
-        chat_log = ChatLog()
-        chat_log.user_type = user_type
-        chat_log.user_id = user_id
-        chat_log.query = query
-        chat_log.response = response
-        db.session.add(chat_log)
-        db.session.commit()
+        log_chat(user_type, user_id, query, response)
+        remember_turn(conversation, query, response)
+        fold_in_background(conversation, (user_type, user_id))
         
         return jsonify({'response': response})
     
@@ -204,44 +239,187 @@ def process_chat():
         logger.error(f"Error processing chat: {str(e)}")
         return jsonify({'error': 'An error occurred while processing your query. Please try a different question.'}), 500
 
-def process_student_query(query, student_id):
+def log_chat(user_type, user_id, query, response):
+    chat_log = ChatLog()
+    chat_log.user_type = user_type
+    chat_log.user_id = user_id
+    chat_log.query = query
+    chat_log.response = response
+    db.session.add(chat_log)
+    db.session.commit()
+
+def remember_turn(conversation, query, response):
+    """Add a finished chat turn to the conversation memory; failed and degraded answers are not remembered"""
+    if isinstance(response, DegradedAnswer) or response in FALLBACK_MESSAGES or response == STUDENT_NOT_FOUND_MESSAGE:
+        return
+    conversation.add_turn(query, response)
+
+def fold_in_background(conversation, user):
+    """Fold older turns into the summary in a background thread, so neither the reply nor the worker waits on it"""
+    if not conversation.fold_due():
+        return
+    app = current_app._get_current_object()
+
+    def fold():
+        with app.app_context():
+            fold_conversation(conversation, user)
+
+    threading.Thread(target=fold, daemon=True).start()
+
+def fold_conversation(conversation, user):
+    lease = f"fold:{conversation.key}"
+    if not conversation.fold_due() or not conversation_folds.acquire(lease):
+        return
+    try:
+        folded = conversation.turns_to_fold()
+        summary = None
+        try:
+            summary = summarize_conversation(conversation.summary, folded, user)
+        except Exception as e:
+            logger.error(f"Error summarizing conversation {conversation.key}: {str(e)}")
+        conversation.fold(folded, summary)
+    except Exception as e:
+        logger.error(f"Error folding conversation {conversation.key}: {str(e)}")
+    finally:
+        conversation_folds.release(lease)
+
+async def fold_conversation_async(conversation, user):
+    """Async variant of fold_conversation"""
+    lease = f"fold:{conversation.key}"
+    if not conversation.fold_due() or not await asyncio.to_thread(conversation_folds.acquire, lease):
+        return
+    try:
+        folded = conversation.turns_to_fold()
+        summary = None
+        try:
+            summary = await summarize_conversation_async(conversation.summary, folded, user)
+        except Exception as e:
+            logger.error(f"Error summarizing conversation {conversation.key}: {str(e)}")
+        await asyncio.to_thread(conversation.fold, folded, summary)
+    except Exception as e:
+        logger.error(f"Error folding conversation {conversation.key}: {str(e)}")
+    finally:
+        await asyncio.to_thread(conversation_folds.release, lease)
+
+def summarize_conversation(summary, turns, user):
+    """Fold older turns into the running conversation summary; None if no summary could be generated.
+
+    The summary tokens are charged to the user, but it is not one of their
+    requests, so it neither counts against their request rate nor as a
+    degraded answer.
+    """
+    text = generate_response(build_summary_prompt(summary, turns, user), user=user, background=True)
+    return None if text in FALLBACK_MESSAGES else text.strip()
+
+async def summarize_conversation_async(summary, turns, user):
+    """Async variant of summarize_conversation"""
+    text = await generate_response_async(build_summary_prompt(summary, turns, user), user=user, background=True)
+    return None if text in FALLBACK_MESSAGES else text.strip()
+
+def build_summary_prompt(summary, turns, user):
+    speaker = user[0].capitalize()
+    exchanges = "\n".join(f"{speaker}: {query}\nAssistant: {response}" for query, response in turns)
+    return f"""
+    You maintain a running summary of a conversation with a {user[0]} of
+    Dr. Mahalingam College of Engineering and Technology.
+    
+    Current summary:
+    {summary or "(none yet)"}
+    
+    New messages:
+    {exchanges}
+    
+    Rewrite the summary so it also covers the new messages. Keep the topics asked about,
+    names, semesters, numbers and any conclusions reached, and drop pleasantries.
+    Reply with the summary only, in at most {current_app.config['CONVERSATION_SUMMARY_MAX_CHARS'] // 6} words.
+    """
+
+def process_student_query(query, student_id, conversation=None):
     # Get student data
-    student = db.session.query(Student).filter(Student.id == student_id).first()
+    student = get_student_snapshot(student_id)
+    if not student:
+        return STUDENT_NOT_FOUND_MESSAGE
+    
+    # Serve the precomputed insight for general "how am I doing" questions
+    if is_overview_question(query):
+        insight = get_fresh_insight(student)
+        if insight:
+            return insight
+    
+    return generate_response(build_student_prompt(query, student, conversation), user=('student', student_id),
+                             fallback=lambda: student_fallback_response(student))
+
+async def process_student_query_async(query, student_id, conversation=None):
+    """Async variant of process_student_query; database work runs in worker threads"""
+    student = await asyncio.to_thread(get_student_snapshot, student_id)
     if not student:
-        return "Sorry, I couldn't find your student record."
+        return STUDENT_NOT_FOUND_MESSAGE
+    
+    # Serve the precomputed insight for general "how am I doing" questions
+    if is_overview_question(query):
+        insight = await asyncio.to_thread(get_fresh_insight, student)
+        if insight:
+            return insight
+    
+    prompt = await asyncio.to_thread(build_student_prompt, query, student, conversation)
+    return await generate_response_async(prompt, user=('student', student_id),
+                                         fallback=lambda: student_fallback_response(student))
+
+def student_fallback_response(student):
+    """Answer from the student's stored record, used when a generation budget is exhausted"""
+    semesters = ", ".join(
+        f"Semester {i}: {student[f'sem{i}']}" for i in range(1, 7) if student[f'sem{i}'] is not None
+    )
+    lines = [
+        BUDGET_NOTICE,
+        "",
+        f"**Major:** {student['major']}",
+        f"**Current GPA:** {student['current_gpa']}",
+        f"**Attendance:** {student['days_present']} days present out of {student['total_days']} total days",
+    ]
+    if semesters:
+        lines.append(f"**Semester results:** {semesters}")
+    insight = get_fresh_insight(student)
+    if insight:
+        lines += ["", insight]
+    return "\n".join(lines)
+
+def build_student_prompt(query, student, conversation=None):
+    # Follow-up questions borrow the keywords of the previous question
+    keyword_text = f"{conversation.turns[-1][0]} {query}" if conversation and conversation.turns else query
     
     # Create safe tokenization with simple split for fallback
     try:
         # Try NLTK tokenization first
-        tokens = word_tokenize(query.lower())
+        tokens = word_tokenize(keyword_text.lower())
         stop_words = set(stopwords.words('english'))
         filtered_tokens = [word for word in tokens if word.isalnum() and word not in stop_words]
     except Exception as e:
         # Fallback to simple tokenization if NLTK fails
         logger.error(f"NLTK tokenization failed: {str(e)}")
-        tokens = query.lower().split()
+        tokens = keyword_text.lower().split()
         filtered_tokens = [word for word in tokens if len(word) > 2]
     
     # Identify entities and keywords
     keywords = set(filtered_tokens)
     
-    # Create student info dictionary manually instead of using __dict__
+    # Create student info dictionary from the cached snapshot
     student_info = {
-        'id': student.id,
-        'serial_no': student.serial_no,
-        'roll_no': student.roll_no,
-        'name': student.name,
-        'major': student.major,
-        'current_gpa': student.current_gpa,
-        'days_present': student.days_present,
-        'total_days': student.total_days,
-        'days_absent': student.days_absent,
-        'courses': student.courses,
-        'date_of_birth': str(student.date_of_birth) if student.date_of_birth else None,
-        'gender': student.gender,
-        'father_name': student.father_name,
-        'mother_name': student.mother_name,
-        'hobbies': student.hobbies
+        'id': student['id'],
+        'serial_no': student['serial_no'],
+        'roll_no': student['roll_no'],
+        'name': student['name'],
+        'major': student['major'],
+        'current_gpa': student['current_gpa'],
+        'days_present': student['days_present'],
+        'total_days': student['total_days'],
+        'days_absent': student['days_absent'],
+        'courses': student['courses'],
+        'date_of_birth': str(student['date_of_birth']) if student['date_of_birth'] else None,
+        'gender': student['gender'],
+        'father_name': student['father_name'],
+        'mother_name': student['mother_name'],
+        'hobbies': student['hobbies']
     }
     
     # Prepare context
@@ -265,35 +443,38 @@ def process_student_query(query, student_id):
     You need to answer a student's query based on their academic information.
     
     Student Information:
-    Name: {student.name}
-    Roll Number: {student.roll_no}
-    Serial Number: {student.serial_no}
-    Major: {student.major}
-    Current GPA: {student.current_gpa}
-    Attendance: {student.days_present} days present out of {student.total_days} total days
-    Courses: {student.courses}
+    Name: {student['name']}
+    Roll Number: {student['roll_no']}
+    Serial Number: {student['serial_no']}
+    Major: {student['major']}
+    Current GPA: {student['current_gpa']}
+    Attendance: {student['days_present']} days present out of {student['total_days']} total days
+    Courses: {student['courses']}
     
     Semester Results:
-    Semester 1: {student.sem1}
-    Semester 2: {student.sem2}
-    Semester 3: {student.sem3}
-    Semester 4: {student.sem4}
-    Semester 5: {student.sem5}
-    Semester 6: {student.sem6}
+    Semester 1: {student['sem1']}
+    Semester 2: {student['sem2']}
+    Semester 3: {student['sem3']}
+    Semester 4: {student['sem4']}
+    Semester 5: {student['sem5']}
+    Semester 6: {student['sem6']}
     
     Personal Information:
-    Date of Birth: {student.date_of_birth}
-    Gender: {student.gender}
-    Father's Name: {student.father_name}
-    Mother's Name: {student.mother_name}
-    Phone: {student.phone_number}
-    Address: {student.street}, {student.city}, {student.state}, {student.pin_code}
-    Hobbies: {student.hobbies}
+    Date of Birth: {student['date_of_birth']}
+    Gender: {student['gender']}
+    Father's Name: {student['father_name']}
+    Mother's Name: {student['mother_name']}
+    Phone: {student['phone_number']}
+    Address: {student['street']}, {student['city']}, {student['state']}, {student['pin_code']}
+    Hobbies: {student['hobbies']}
     
     Other Context:
     {context.get('code_of_conduct', '')}
     {context.get('uploaded_files_data', '')}
     
+    Conversation so far (use it to understand follow-up questions):
+    {conversation.prompt_text() if conversation and conversation.prompt_text() else "This is the first question."}
+    
     The student's query is: "{query}"
     
     Please provide a helpful, accurate, and friendly response based ONLY on the information provided.
@@ -301,34 +482,60 @@ def process_student_query(query, student_id):
     politely state that you don't have that information.
     """
     
-    try:
-        if model is None:
-            logger.error("Gemini model not initialized")
-            return "I'm sorry, I'm having trouble accessing my knowledge base right now. Please try again later."
-        
-        # Generate response safely
-        generation_response = model.generate_content(prompt)
-        
-        if generation_response and hasattr(generation_response, 'text'):
-            return generation_response.text
-        else:
-            logger.error(f"Invalid response format: {generation_response}")
-            return "I'm sorry, I couldn't generate a proper response. Please try a different question."
-    except Exception as e:
-        logger.error(f"Gemini API error: {str(e)}")
-        return "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+    return prompt
 
-def process_admin_query(query):
+def process_admin_query(query, admin_id=None, conversation=None):
+    # Identical admin prompts coalesce, and only the admin whose request runs the
+    # generation is charged for it; the conversation history keeps sessions apart.
+    # Each admin's own budget is checked before joining, the global one inside.
+    prompt = build_admin_prompt(query, conversation)
+    user = ('admin', admin_id) if admin_id is not None else None
+    key = prompt_key(prompt)
+    cached_response = cache.get('llm', key)
+    if cached_response is not None:
+        return cached_response
+    if user:
+        exceeded = check_user_budget(*user, prompt)
+        if exceeded:
+            return degraded_response(user, exceeded, admin_fallback_response)
+    return admin_generations.do(key, lambda: admin_generations_shared.do(key, lambda: generate_response(
+        prompt, user=user, fallback=admin_fallback_response, user_checked=True
+    )))
+
+async def process_admin_query_async(query, admin_id=None, conversation=None):
+    """Async variant of process_admin_query; database work runs in worker threads"""
+    prompt = await asyncio.to_thread(build_admin_prompt, query, conversation)
+    user = ('admin', admin_id) if admin_id is not None else None
+    key = prompt_key(prompt)
+    cached_response = await asyncio.to_thread(cache.get, 'llm', key)
+    if cached_response is not None:
+        return cached_response
+    if user:
+        exceeded = await asyncio.to_thread(check_user_budget, *user, prompt)
+        if exceeded:
+            return await asyncio.to_thread(degraded_response, user, exceeded, admin_fallback_response)
+    return await admin_generations_async.do(key, lambda: admin_generations_shared.do_async(key, lambda: generate_response_async(
+        prompt, user=user, fallback=admin_fallback_response, user_checked=True
+    )))
+
+def admin_fallback_response():
+    """Answer from the cohort analytics, used when a generation budget is exhausted"""
+    return f"{BUDGET_NOTICE}\n\n{cohort_analytics.summary_text()}"
+
+def build_admin_prompt(query, conversation=None):
+    # Follow-up questions borrow the keywords of the previous question
+    keyword_text = f"{conversation.turns[-1][0]} {query}" if conversation and conversation.turns else query
+    
     # Create safe tokenization with simple split for fallback
     try:
         # Try NLTK tokenization first
-        tokens = word_tokenize(query.lower())
+        tokens = word_tokenize(keyword_text.lower())
         stop_words = set(stopwords.words('english'))
         filtered_tokens = [word for word in tokens if word.isalnum() and word not in stop_words]
     except Exception as e:
         # Fallback to simple tokenization if NLTK fails
         logger.error(f"NLTK tokenization failed: {str(e)}")
-        tokens = query.lower().split()
+        tokens = keyword_text.lower().split()
         filtered_tokens = [word for word in tokens if len(word) > 2]
     
     # Extract relevant keywords
@@ -338,20 +545,10 @@ def process_admin_query(query):
     students_data = []
     if any(word in keywords for word in ['list', 'show', 'students', 'student']):
         # Get all students
-        students = db.session.query(Student).all()
-        students_data = [
-            {
-                'name': student.name,
-                'roll_no': student.roll_no,
-                'serial_no': student.serial_no,
-                'major': student.major,
-                'current_gpa': student.current_gpa,
-                'attendance': f"{student.days_present}/{student.total_days}",
-                'attendance_percentage': round((student.days_present / student.total_days) * 100, 2) if student.total_days > 0 else 0
-            } for student in students
-        ]
+        students_data = cache.get_or_set('students', 'roster', get_student_roster)
     
     # Generate admin-specific prompt
+    stats = get_dashboard_stats()
     prompt = f"""
     You are an administrative assistant for Dr. Mahalingam College of Engineering and Technology.
     An administrator has asked: "{query}"
@@ -359,23 +556,24 @@ def process_admin_query(query):
     Based on the available data, here is what I know:
     
     Student data summary:
-    - Total students: {db.session.query(Student).count()}
-    - Students with attendance below 70%: {sum(1 for s in db.session.query(Student).all() if s.total_days > 0 and (s.days_present / s.total_days) < 0.7)}
-    - Students with GPA above 7: {db.session.query(Student).filter(Student.current_gpa > 7).count()}
+    {cohort_analytics.summary_text()}
     
     Uploaded files:
-    - Total files: {db.session.query(UploadedFile).count()}
-    - CSV files: {db.session.query(UploadedFile).filter(UploadedFile.file_type == 'csv').count()}
-    - PDF files: {db.session.query(UploadedFile).filter(UploadedFile.file_type == 'pdf').count()}
+    - Total files: {stats['total_uploads']}
+    - CSV files: {stats['csv_files']}
+    - PDF files: {stats['pdf_files']}
     
     Chat logs:
-    - Total queries: {db.session.query(ChatLog).count()}
-    - Student queries: {db.session.query(ChatLog).filter(ChatLog.user_type == 'student').count()}
-    - Admin queries: {db.session.query(ChatLog).filter(ChatLog.user_type == 'admin').count()}
+    - Total queries: {stats['total_chats']}
+    - Student queries: {stats['student_chats']}
+    - Admin queries: {stats['admin_chats']}
     
     Student Information (if requested):
     {students_data if students_data else "No specific student data requested."}
     
+    Conversation so far (use it to understand follow-up questions):
+    {conversation.prompt_text() if conversation and conversation.prompt_text() else "This is the first question."}
+    
     Please provide a helpful, accurate, and professional response based ONLY on the information provided.
     Format data as needed to make it readable, and if you're displaying a list of students, 
     organize it in a clear tabular format using markdown.
@@ -383,33 +581,173 @@ def process_admin_query(query):
     If you don't have enough information to answer the query, politely state that you don't have that information.
     """
     
+    return prompt
+
+def generate_response(prompt, user=None, fallback=None, user_checked=False, background=False):
+    """Generate a Gemini response, reusing a cached answer for an identical prompt.
+
+    With a (user_type, user_id) user, the generation is checked against the
+    request and token budgets and its usage is recorded. Over budget,
+    fallback() answers from stored data instead of waiting on Gemini.
+    user_checked skips the user's own budgets, for callers that checked them
+    already or that only the global budget applies to. background marks work
+    the user did not ask for, such as conversation summaries: it is charged
+    to the user but only checked against the global budget, and over it the
+    generation is skipped without counting a degraded answer.
+    """
+    cache_key = prompt_key(prompt)
+    cached_response = cache.get('llm', cache_key)
+    if cached_response is not None:
+        return cached_response
+    
     try:
         if model is None:
             logger.error("Gemini model not initialized")
-            return "I'm sorry, I'm having trouble accessing my knowledge base right now. Please try again later."
+            return MODEL_UNAVAILABLE_MESSAGE
+        
+        if user:
+            exceeded = check_global_budget(prompt) if user_checked or background else check_budget(*user, prompt)
+            if exceeded:
+                if background:
+                    logger.info(f"Gemini {exceeded} budget exceeded; skipping background generation for {user[0]} {user[1]}")
+                    return BUDGET_EXCEEDED_MESSAGE
+                return degraded_response(user, exceeded, fallback)
         
         # Generate response safely
+        started = time.monotonic()
         generation_response = model.generate_content(prompt)
+        text = response_text(generation_response, cache_key)
+        if user:
+            record_generation(*user, prompt, generation_response, text, int((time.monotonic() - started) * 1000))
+        return text
+    except Exception as e:
+        logger.error(f"Gemini API error: {str(e)}")
+        return GENERATION_ERROR_MESSAGE
+
+async def generate_response_async(prompt, user=None, fallback=None, user_checked=False, background=False):
+    """Async variant of generate_response using the SDK's async generation"""
+    cache_key = prompt_key(prompt)
+    cached_response = await asyncio.to_thread(cache.get, 'llm', cache_key)
+    if cached_response is not None:
+        return cached_response
+    
+    try:
+        if model is None:
+            logger.error("Gemini model not initialized")
+            return MODEL_UNAVAILABLE_MESSAGE
         
-        if generation_response and hasattr(generation_response, 'text'):
-            return generation_response.text
-        else:
-            logger.error(f"Invalid response format: {generation_response}")
-            return "I'm sorry, I couldn't generate a proper response. Please try a different question."
+        if user:
+            if user_checked or background:
+                exceeded = await asyncio.to_thread(check_global_budget, prompt)
+            else:
+                exceeded = await asyncio.to_thread(check_budget, *user, prompt)
+            if exceeded:
+                if background:
+                    logger.info(f"Gemini {exceeded} budget exceeded; skipping background generation for {user[0]} {user[1]}")
+                    return BUDGET_EXCEEDED_MESSAGE
+                return await asyncio.to_thread(degraded_response, user, exceeded, fallback)
+        
+        # Generate response safely without holding a thread
+        started = time.monotonic()
+        generation_response = await model.generate_content_async(prompt)
+        text = await asyncio.to_thread(response_text, generation_response, cache_key)
+        if user:
+            await asyncio.to_thread(record_generation, *user, prompt, generation_response, text,
+                                    int((time.monotonic() - started) * 1000))
+        return text
     except Exception as e:
         logger.error(f"Gemini API error: {str(e)}")
-        return "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+        return GENERATION_ERROR_MESSAGE
+
+def degraded_response(user, exceeded, fallback):
+    """Answer without Gemini once a budget is exhausted"""
+    logger.warning(f"Gemini {exceeded} budget exceeded for {user[0]} {user[1]}; serving a fallback answer")
+    record_usage(*user, degraded=1)
+    return DegradedAnswer(fallback() if fallback else BUDGET_EXCEEDED_MESSAGE)
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+def response_text(generation_response, cache_key):
+    """Extract the text of a Gemini response and cache it under the prompt key"""
+    if generation_response and hasattr(generation_response, 'text'):
+        cache.set('llm', cache_key, generation_response.text, ttl=current_app.config['LLM_CACHE_TTL'])
+        return generation_response.text
+    else:
+        logger.error(f"Invalid response format: {generation_response}")
+        return INVALID_RESPONSE_MESSAGE
+
+def get_student_roster():
+    students = db.session.query(Student).all()
+    return [
+        {
+            'name': student.name,
+            'roll_no': student.roll_no,
+            'serial_no': student.serial_no,
+            'major': student.major,
+            'current_gpa': student.current_gpa,
+            'attendance': f"{student.days_present}/{student.total_days}",
+            'attendance_percentage': round((student.days_present / student.total_days) * 100, 2) if student.total_days > 0 else 0
+        } for student in students
+    ]
+
+def get_student_snapshot(student_id):
+    """Return a student's record as a plain dict, cached across workers"""
+    def load():
+        student = db.session.query(Student).filter(Student.id == student_id).first()
+        if not student:
+            return None
+        return {column.name: getattr(student, column.name) for column in Student.__table__.columns}
+    return cache.get_or_set('students', student_id, load)
+
+def read_pdf_text(pdf_path):
+    """Extract PDF text using the configured extraction pool settings.
+
+    Returns the text and whether every page was extracted.
+    """
+    text, skipped = extract_pdf_text(
+        pdf_path,
+        workers=current_app.config.get('PDF_EXTRACTION_WORKERS'),
+        page_timeout=current_app.config.get('PDF_PAGE_TIMEOUT')
+    )
+    return text, not skipped
+
+def read_uploaded_pdf_text(file):
+    """Return the text of an uploaded PDF, reusing text already extracted for the same content"""
+    if file.content_hash:
+        cached_text = cache.get('documents', file.content_hash)
+        if cached_text is not None:
+            return cached_text
+    
+    stored_file = None
+    if file.content_hash:
+        stored_file = db.session.query(StoredFile).filter(StoredFile.content_hash == file.content_hash).first()
+        if stored_file and stored_file.extracted_text is not None:
+            cache.set('documents', file.content_hash, stored_file.extracted_text)
+            return stored_file.extracted_text
+    
+    text, complete = read_pdf_text(file.file_path)
+    
+    # Pages skipped under load are retried on the next read instead of being lost for good
+    if stored_file and complete:
+        stored_file.extracted_text = text
+        db.session.commit()
+        cache.set('documents', file.content_hash, text)
+    return text
 
 def extract_code_of_conduct():
     try:
         # Read the code of conduct file from PDF
         pdf_path = os.path.join(os.getcwd(), "data", "code_of_conduct.pdf")
         if os.path.exists(pdf_path):
-            with pdfplumber.open(pdf_path) as pdf:
-                text = ""
-                for page in pdf.pages:
-                    text += page.extract_text() + "\n"
-                return text
+            cache_key = f"{pdf_path}:{os.path.getmtime(pdf_path)}"
+            cached_text = cache.get('documents', cache_key)
+            if cached_text is not None:
+                return cached_text
+            text, complete = read_pdf_text(pdf_path)
+            if complete:
+                cache.set('documents', cache_key, text)
+            return text
         else:
             # If PDF not found, return a generic message about code of conduct
             return """
@@ -430,19 +768,24 @@ def get_data_from_uploaded_files(student):
     result = ""
     
     try:
-        # Get all uploaded files
-        files = UploadedFile.query.all()
+        # Get all uploaded files, reading identical content only once
+        files = UploadedFile.query.order_by(UploadedFile.uploaded_at).all()
+        seen_content = set()
         
         for file in files:
             file_path = file.file_path
+            content_key = file.content_hash or file_path
+            if content_key in seen_content:
+                continue
+            seen_content.add(content_key)
             
             if file.file_type == 'csv':
                 # Extract data from CSV
                 try:
                     df = pd.read_csv(file_path)
                     # Check if student info exists in the CSV
-                    student_row = df[(df['serial_no'] == student.serial_no) | 
-                                    (df['roll_no'] == student.roll_no)]
+                    student_row = df[(df['serial_no'] == student['serial_no']) | 
+                                    (df['roll_no'] == student['roll_no'])]
                     
                     if not student_row.empty:
                         result += f"\nData from {file.filename}:\n"
@@ -453,14 +796,11 @@ def get_data_from_uploaded_files(student):
             elif file.file_type == 'pdf':
                 # Extract data from PDF
                 try:
-                    with pdfplumber.open(file_path) as pdf:
-                        text = ""
-                        for page in pdf.pages:
-                            text += page.extract_text() + "\n"
-                        
-                        # Simple check for student name in PDF
-                        if student.name.lower() in text.lower() or student.roll_no in text:
-                            result += f"\nThe student is mentioned in {file.filename}."
+                    text = read_uploaded_pdf_text(file)
+                    
+                    # Simple check for student name in PDF
+                    if student['name'].lower() in text.lower() or student['roll_no'] in text:
+                        result += f"\nThe student is mentioned in {file.filename}."
                 except Exception as e:
                     logger.error(f"Error reading PDF file {file.filename}: {str(e)}")
     
@@ -0,0 +1,123 @@
+import uuid
+import logging
+import datetime
+from flask import current_app
+from models import db, ChatLog
+from cache import cache
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+# Longest query or answer kept verbatim in the prompt
+TURN_MAX_CHARS = 800
+
+
+def clip(text, limit):
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def start_conversation(session):
+    """Begin a new conversation for a freshly logged-in session"""
+    session['conversation_id'] = uuid.uuid4().hex
+    session['conversation_started'] = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def end_conversation(session):
+    if session.get('conversation_id'):
+        cache.delete('conversations', session['conversation_id'])
+
+
+class Conversation:
+    """Chat memory of one session: the latest turns verbatim plus a rolling summary of older ones.
+
+    Once 2 * CONVERSATION_RECENT_TURNS turns have accumulated, the oldest
+    ones are folded into the summary in one step, so the summary is only
+    rewritten every few turns and the prompt never grows past the summary
+    limit plus a fixed number of clipped turns. Folding is left to the
+    caller, which runs it after the reply has been sent.
+    """
+
+    def __init__(self, key, user_type, summary='', turns=None):
+        self.key = key
+        self.user_type = user_type
+        self.summary = summary
+        self.turns = turns or []
+
+    @classmethod
+    def load(cls, session):
+        """Load the conversation of a session from the cache.
+
+        If the cached state was evicted, the recent turns are rebuilt from
+        the chat logs written since the session logged in.
+        """
+        user_type, user_id = session['user_type'], session['user_id']
+        # Sessions that logged in before conversations existed share one per user
+        key = session.get('conversation_id') or f"{user_type}-{user_id}"
+        state = cache.get('conversations', key)
+        if state is not None:
+            return cls(key, user_type, state['summary'], state['turns'])
+
+        conversation = cls(key, user_type)
+        if session.get('conversation_started'):
+            try:
+                started = datetime.datetime.strptime(session['conversation_started'], '%Y-%m-%d %H:%M:%S')
+                logs = db.session.query(ChatLog.query, ChatLog.response).filter(
+                    ChatLog.user_type == user_type, ChatLog.user_id == user_id, ChatLog.timestamp >= started
+                ).order_by(ChatLog.timestamp.desc(), ChatLog.id.desc()).limit(
+                    current_app.config['CONVERSATION_RECENT_TURNS']
+                ).all()
+                conversation.turns = [[log.query, log.response] for log in reversed(logs)]
+            except Exception as e:
+                logger.error(f"Error rebuilding conversation {key}: {str(e)}")
+        return conversation
+
+    def prompt_text(self):
+        """The conversation so far, formatted for a prompt; empty for a new conversation"""
+        if not self.summary and not self.turns:
+            return ''
+        speaker = self.user_type.capitalize()
+        lines = []
+        if self.summary:
+            lines.append(f"Summary of the earlier conversation: {self.summary}")
+        if self.turns:
+            lines.append("Most recent messages:")
+            for query, response in self.turns:
+                lines.append(f"{speaker}: {clip(query, TURN_MAX_CHARS)}")
+                lines.append(f"Assistant: {clip(response, TURN_MAX_CHARS)}")
+        return "\n".join(lines)
+
+    def add_turn(self, query, response):
+        """Remember a turn; fold_due() tells when the oldest turns should be summarized"""
+        self.turns.append([query, response])
+        self.save()
+
+    def fold_due(self):
+        return len(self.turns) >= 2 * current_app.config['CONVERSATION_RECENT_TURNS']
+
+    def turns_to_fold(self):
+        return self.turns[:-current_app.config['CONVERSATION_RECENT_TURNS']]
+
+    def fold(self, folded, summary):
+        """Replace the folded turns by the updated summary.
+
+        Without a summary, a plain digest of the folded questions is used.
+        Turns added by other requests while the summary was generated are
+        kept; if another request already folded these turns, nothing changes.
+        """
+        max_chars = current_app.config['CONVERSATION_SUMMARY_MAX_CHARS']
+        state = cache.get('conversations', self.key)
+        turns = state['turns'] if state is not None else self.turns
+        if [list(turn) for turn in turns[:len(folded)]] != folded:
+            return
+
+        if not summary:
+            digest = "; ".join(clip(query, 150) for query, _ in folded)
+            summary = f"{self.summary} Earlier questions: {digest}".strip()
+        # Keep the newest part of an over-long summary
+        self.summary = summary if len(summary) <= max_chars else "..." + summary[-(max_chars - 3):]
+        self.turns = turns[len(folded):]
+        self.save()
+
+    def save(self):
+        cache.set('conversations', self.key, {'summary': self.summary, 'turns': self.turns},
+                  ttl=current_app.config['CONVERSATION_TTL'])
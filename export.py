@@ -0,0 +1,218 @@
+import io
+import csv
+import logging
+import datetime
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
+from sqlalchemy import select, Integer, Float, Boolean, Date, DateTime
+from models import db, Student, ChatLog
+from admin import admin_required
+from retention import iter_archived_logs
+
+# pyarrow is optional; only the Parquet and Arrow formats need it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+export_bp = Blueprint('export', __name__)
+
+# Exportable tables: model, column used by the date-range filter
+EXPORTS = {
+    'students': (Student, Student.created_at),
+    'chatlogs': (ChatLog, ChatLog.timestamp),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+class ChunkSink:
+    """Write-only file object whose contents are drained after every batch"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def arrow_type(column):
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp('us')
+    if isinstance(column.type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def parse_date(value, name):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+
+def build_export_query(table, args):
+    """Build the filtered select for an export from the request arguments"""
+    model, date_column = EXPORTS[table]
+    available = [column.name for column in model.__table__.columns]
+
+    fields = [field.strip() for field in args.get('fields', '').split(',') if field.strip()] or available
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available fields: {', '.join(available)}")
+    columns = [model.__table__.columns[field] for field in fields]
+
+    query = select(*columns)
+    if args.get('start'):
+        query = query.where(date_column >= parse_date(args['start'], 'start'))
+    if args.get('end'):
+        # The end date is inclusive
+        query = query.where(date_column < parse_date(args['end'], 'end') + datetime.timedelta(days=1))
+    if table == 'chatlogs' and args.get('user_type'):
+        query = query.where(ChatLog.user_type == args['user_type'])
+
+    return query.order_by(model.id), columns
+
+
+def iter_batches(query, batch_size):
+    """Yield lists of rows from a server-side cursor, batch_size rows at a time"""
+    result = db.session.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+    for partition in result.partitions(batch_size):
+        yield partition
+
+
+def iter_archive_batches(args, columns, batch_size):
+    """Yield lists of rows from the chat log archive, filtered like build_export_query"""
+    start = parse_date(args['start'], 'start').date() if args.get('start') else None
+    end = parse_date(args['end'], 'end').date() if args.get('end') else None
+    batch = []
+    for log in iter_archived_logs(current_app.config['CHATLOG_ARCHIVE_FOLDER'], start, end):
+        if args.get('user_type') and log['user_type'] != args['user_type']:
+            continue
+        log['timestamp'] = datetime.datetime.strptime(log['timestamp'], '%Y-%m-%d %H:%M:%S')
+        batch.append(tuple(log[column.name] for column in columns))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stream_csv(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in columns])
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def record_batch(batch, columns, schema):
+    values = list(zip(*batch)) if batch else [[] for _ in columns]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column_values, type=field.type) for column_values, field in zip(values, schema)],
+        schema=schema
+    )
+
+
+def stream_arrow(batches, columns, file_format):
+    schema = pa.schema([(column.name, arrow_type(column)) for column in columns])
+    sink = ChunkSink()
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    try:
+        for batch in batches:
+            # Each batch becomes its own Parquet row group or Arrow IPC message
+            writer.write_batch(record_batch(batch, columns, schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+@export_bp.route('/admin/export/<table>.<file_format>', methods=['GET'])
+@admin_required
+def export_table(table, file_format):
+    """Stream a table as CSV, Parquet or Arrow IPC with optional start/end/fields filters.
+
+    Chat logs moved to the archive are exported with source=archive.
+    """
+    if table not in EXPORTS:
+        return jsonify({'error': f'Unknown export. Available exports: {", ".join(EXPORTS)}'}), 404
+    if file_format not in FORMATS:
+        return jsonify({'error': f'Unknown format. Available formats: {", ".join(FORMATS)}'}), 404
+    if file_format != 'csv' and pa is None:
+        return jsonify({'error': 'Parquet and Arrow exports require the pyarrow package'}), 501
+
+    source = request.args.get('source', 'database')
+    if source not in ('database', 'archive') or (source == 'archive' and table != 'chatlogs'):
+        return jsonify({'error': 'source must be "database", or "archive" for chatlogs'}), 400
+
+    try:
+        query, columns = build_export_query(table, request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    if source == 'archive':
+        batches = iter_archive_batches(request.args, columns, batch_size)
+    else:
+        batches = iter_batches(query, batch_size)
+
+    if file_format == 'csv':
+        body = stream_csv(batches, columns)
+    else:
+        body = stream_arrow(batches, columns, file_format)
+
+    if source == 'archive':
+        table = f"{table}_archive"
+    filename = f"{table}_{datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{file_format}"
+    logger.info(f"Exporting {table} as {file_format}")
+    return current_app.response_class(
+        stream_with_context(body),
+        mimetype=FORMATS[file_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
@@ -0,0 +1,178 @@
+import os
+import gzip
+import hashlib
+import logging
+from functools import wraps, lru_cache
+from flask import request, make_response
+
+# brotli is optional; without it responses are only gzip-compressed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'text/css',
+    'text/html',
+    'text/plain',
+    'text/csv',
+    'image/svg+xml',
+}
+
+# Static files requested with their current content hash never change
+STATIC_MAX_AGE = 365 * 24 * 60 * 60  # seconds
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def choose_encoding(accept_encoding):
+    """Pick the best content coding the client accepts: brotli, then gzip"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    def allowed(coding):
+        return accepted.get(coding, accepted.get('*', 0)) > 0
+
+    if brotli is not None and allowed('br'):
+        return 'br'
+    if allowed('gzip'):
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_body(body, mimetype, accept_encoding, min_size):
+    """Compress a response body when it is large enough and the client accepts it.
+
+    Returns the body and its content coding, or None when left as is.
+    """
+    if len(body) < min_size or mimetype not in COMPRESSIBLE_MIMETYPES:
+        return body, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    return compress(body, encoding), encoding
+
+
+@lru_cache(maxsize=64)
+def compress_static(path, mtime, encoding):
+    """Static files are compressed once per version instead of on every request"""
+    with open(path, 'rb') as f:
+        return compress(f.read(), encoding)
+
+
+@lru_cache(maxsize=256)
+def file_hash(path, mtime, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def static_file_hash(static_folder, filename):
+    """Short content hash of a static file, or None if it does not exist"""
+    path = os.path.join(static_folder, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return file_hash(path, stat.st_mtime, stat.st_size)
+
+
+def conditional_get(view):
+    """Add an ETag to a read-only JSON view and answer matching If-None-Match with 304"""
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if request.method == 'GET' and response.status_code == 200 and not response.is_streamed:
+            response.add_etag()
+            # Admin data: browsers may keep it but must revalidate, proxies must not store it
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.make_conditional(request)
+        return response
+    return decorated_function
+
+
+def init_http_cache(app):
+    """Serve static files under content-hashed URLs and compress large responses"""
+
+    @app.url_defaults
+    def add_static_hash(endpoint, values):
+        # url_for('static', filename=...) gains ?v=<hash>, so new content gets a new URL
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            version = static_file_hash(app.static_folder, values['filename'])
+            if version:
+                values['v'] = version
+
+    @app.after_request
+    def cache_and_compress(response):
+        if request.endpoint == 'static' and response.status_code == 200:
+            filename = request.view_args.get('filename')
+            if request.args.get('v') and request.args.get('v') == static_file_hash(app.static_folder, filename):
+                response.cache_control.no_cache = None
+                response.cache_control.public = True
+                response.cache_control.max_age = STATIC_MAX_AGE
+                response.cache_control.immutable = True
+            compress_static_response(app, response, filename)
+            return response
+
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        body, encoding = compress_body(response.get_data(), response.mimetype,
+                                       request.headers.get('Accept-Encoding'), app.config['COMPRESS_MIN_SIZE'])
+        if encoding:
+            set_compressed_body(response, body, encoding)
+        return response
+
+
+def compress_static_response(app, response, filename):
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers:
+        return
+    path = os.path.join(app.static_folder, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return
+    response.vary.add('Accept-Encoding')
+    if stat.st_size < app.config['COMPRESS_MIN_SIZE']:
+        return
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return
+    response.close()
+    response.direct_passthrough = False
+    set_compressed_body(response, compress_static(path, stat.st_mtime, encoding), encoding)
+
+
+def set_compressed_body(response, body, encoding):
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes are a different representation of the same resource
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
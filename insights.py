@@ -0,0 +1,209 @@
+import re
+import json
+import asyncio
+import hashlib
+import logging
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+from models import db, Student, StudentInsight
+from analytics import cohort_analytics, SEMESTER_COLUMNS, LOW_ATTENDANCE_THRESHOLD, FALLING_GPA_SLOPE
+from cache import cache
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+# Student fields an insight is derived from; a change to any of them makes it stale
+INSIGHT_FIELDS = ['major', 'current_gpa', 'days_present', 'total_days'] + SEMESTER_COLUMNS
+
+# Questions that, as a whole, ask for a general progress overview; anything more specific goes to Gemini
+OVERVIEW_PATTERN = re.compile(
+    r"^\s*(how am i doing|how am i performing|how'?s my progress|how is my progress|"
+    r"what'?s my (overall )?(progress|standing)|what is my (overall )?(progress|standing)|"
+    r"(my )?overall (performance|progress|standing)|my (progress|standing))"
+    r"( so far| overall| this year)?\s*[?.!]*\s*$",
+    re.IGNORECASE
+)
+
+RISING_GPA_SLOPE = 0.25  # GPA points gained per semester
+
+# Usage of the --llm pass is recorded under this (user_type, user_id) and counts against the global budget
+INSIGHT_USAGE_USER = ('system', 0)
+
+
+def student_data_hash(student):
+    """Hash the insight fields of a student given as a dict or row mapping"""
+    values = {field: student[field] for field in INSIGHT_FIELDS}
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def is_overview_question(query):
+    """Whether the whole question asks for a general overview.
+
+    >>> is_overview_question("How am I doing?")
+    True
+    >>> is_overview_question("what's my overall standing")
+    True
+    >>> is_overview_question("how is my progress in sem 4?")
+    False
+    >>> is_overview_question("what was my standing in the sem 3 exam")
+    False
+    >>> is_overview_question("is my progress report uploaded?")
+    False
+    >>> is_overview_question("How am I doing in Chemistry?")
+    False
+    """
+    return bool(OVERVIEW_PATTERN.match(query))
+
+
+def format_summary(major, gpa, attendance, semesters, slope, percentile, major_mean):
+    lines = []
+
+    results = [(column, value) for column, value in zip(SEMESTER_COLUMNS, semesters) if not np.isnan(value)]
+    if len(results) >= 2 and not np.isnan(slope):
+        if slope <= FALLING_GPA_SLOPE:
+            direction = f"falling by about {abs(slope):.2f} points per semester"
+        elif slope >= RISING_GPA_SLOPE:
+            direction = f"rising by about {slope:.2f} points per semester"
+        else:
+            direction = "fairly steady"
+        first, last = results[0], results[-1]
+        lines.append(f"**GPA trend:** Your semester results are {direction} "
+                     f"({first[0].replace('sem', 'Semester ')}: {first[1]:.2f}, {last[0].replace('sem', 'Semester ')}: {last[1]:.2f}).")
+    elif results:
+        lines.append(f"**GPA trend:** Only one semester result is available so far ({results[0][1]:.2f}).")
+
+    if not np.isnan(attendance):
+        if attendance < LOW_ATTENDANCE_THRESHOLD:
+            lines.append(f"**Attendance:** {attendance * 100:.1f}%, which is below the required "
+                         f"{int(LOW_ATTENDANCE_THRESHOLD * 100)}%. Please try to attend more classes.")
+        else:
+            lines.append(f"**Attendance:** {attendance * 100:.1f}%, which meets the "
+                         f"{int(LOW_ATTENDANCE_THRESHOLD * 100)}% requirement.")
+
+    if not np.isnan(gpa) and not np.isnan(percentile):
+        lines.append(f"**Standing in {major}:** Your current GPA of {gpa:.2f} is at or above {percentile:.0f}% "
+                     f"of {major} students (major average {major_mean:.2f}).")
+
+    return "\n".join(lines) if lines else "There is not enough academic data yet to summarise your progress."
+
+
+def compute_insights():
+    """Compute the deterministic insight for every student from the analytics arrays"""
+    standing = cohort_analytics.student_standing()
+    insights = {}
+    for i, student_id in enumerate(standing['ids']):
+        insights[int(student_id)] = {
+            'gpa_trend': None if np.isnan(standing['gpa_slope'][i]) else round(float(standing['gpa_slope'][i]), 3),
+            'attendance_percentage': None if np.isnan(standing['attendance'][i]) else round(float(standing['attendance'][i] * 100), 2),
+            'major_percentile': None if np.isnan(standing['major_percentile'][i]) else round(float(standing['major_percentile'][i]), 1),
+            'summary': format_summary(
+                standing['majors'][i], standing['gpa'][i], standing['attendance'][i], standing['semesters'][i],
+                standing['gpa_slope'][i], standing['major_percentile'][i], standing['major_gpa_mean'][i]
+            ),
+        }
+    return insights
+
+
+async def generate_llm_summaries(pending, concurrency):
+    """Rewrite deterministic summaries in a friendlier tone, at most `concurrency` at a time"""
+    # Import here to avoid circular imports
+    from chatbot import generate_response_async, FALLBACK_MESSAGES
+
+    semaphore = asyncio.Semaphore(concurrency)
+    app = current_app._get_current_object()
+
+    async def summarise(student_id, name, summary):
+        prompt = f"""
+    You are an educational assistant for Dr. Mahalingam College of Engineering and Technology.
+    Rewrite the following progress summary for the student {name} as a short, encouraging message
+    of at most five sentences. Keep every number exactly as given and do not add new facts.
+
+    {summary}
+    """
+        # Each generation gets its own app context, and so its own database session for usage
+        # accounting, instead of sharing the caller's session that holds the uncommitted insights
+        async with semaphore:
+            with app.app_context():
+                text = await generate_response_async(prompt, user=INSIGHT_USAGE_USER, user_checked=True)
+        return student_id, (None if text in FALLBACK_MESSAGES else text)
+
+    results = await asyncio.gather(*(summarise(*item) for item in pending))
+    return dict(results)
+
+
+def refresh_insights(force=False, use_llm=False, concurrency=4):
+    """Store insights for students whose data or derived summary changed.
+
+    Returns the number of insights written.
+    """
+    insights = compute_insights()
+
+    columns = [Student.id, Student.name] + [getattr(Student, field) for field in INSIGHT_FIELDS]
+    students = {row.id: row for row in db.session.query(*columns).all()}
+    existing = {insight.student_id: insight for insight in db.session.query(StudentInsight).all()}
+
+    changed = []
+    for student_id, insight in insights.items():
+        row = students.get(student_id)
+        if row is None:
+            continue
+        data_hash = student_data_hash(row._mapping)
+        current = existing.get(student_id)
+        if not force and current and current.data_hash == data_hash and current.summary == insight['summary']:
+            continue
+
+        if current is None:
+            current = StudentInsight()
+            current.student_id = student_id
+            db.session.add(current)
+        current.data_hash = data_hash
+        current.gpa_trend = insight['gpa_trend']
+        current.attendance_percentage = insight['attendance_percentage']
+        current.major_percentile = insight['major_percentile']
+        current.summary = insight['summary']
+        current.llm_summary = None
+        changed.append((student_id, row.name, current))
+
+    # Remove insights of students that no longer exist
+    for student_id, insight in existing.items():
+        if student_id not in students:
+            db.session.delete(insight)
+
+    if use_llm and changed:
+        llm_summaries = asyncio.run(generate_llm_summaries(
+            [(student_id, name, insight.summary) for student_id, name, insight in changed], concurrency
+        ))
+        for student_id, _, insight in changed:
+            insight.llm_summary = llm_summaries.get(student_id)
+
+    db.session.commit()
+    logger.info(f"Refreshed {len(changed)} of {len(insights)} student insights")
+    return len(changed)
+
+
+def get_fresh_insight(student):
+    """Return the stored insight text for a student snapshot, or None if missing or stale"""
+    def load():
+        insight = db.session.query(StudentInsight).filter(StudentInsight.student_id == student['id']).first()
+        if not insight:
+            return None
+        return {'data_hash': insight.data_hash, 'text': insight.llm_summary or insight.summary}
+
+    insight = cache.get_or_set('insights', student['id'], load)
+    if not insight or insight['data_hash'] != student_data_hash(student):
+        return None
+    return insight['text']
+
+
+@click.command('precompute-insights')
+@click.option('--force', is_flag=True, help='Recompute every student, not only changed ones.')
+@click.option('--llm', 'use_llm', is_flag=True, help='Also write an LLM-phrased summary for changed students.')
+@click.option('--concurrency', default=None, type=int, help='Maximum concurrent LLM generations.')
+@with_appcontext
+def precompute_insights_command(force, use_llm, concurrency):
+    """Precompute per-student progress insights."""
+    concurrency = concurrency or current_app.config['INSIGHT_LLM_CONCURRENCY']
+    count = refresh_insights(force=force, use_llm=use_llm, concurrency=concurrency)
+    click.echo(f"Refreshed {count} student insights.")
@@ -1,6 +1,7 @@
 import logging
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from models import db, User, Student
+from conversation import start_conversation, end_conversation
 
 login_bp = Blueprint('login', __name__)
 logger = logging.getLogger(__name__)
@@ -43,6 +44,7 @@ def handle_student_login():
         session['student_serial'] = student.serial_no
         session['student_roll'] = student.roll_no
         session['student_name'] = student.name
+        start_conversation(session)
         
         logger.info(f"Student login successful: {student.name}")
         return redirect(url_for('chatbot.chat'))
@@ -70,6 +72,7 @@ def handle_admin_login():
         session['user_type'] = 'admin'
         session['user_id'] = admin.id
         session['admin_email'] = admin.email
+        start_conversation(session)
         
         logger.info(f"Admin login successful: {admin.email}")
         return redirect(url_for('admin.dashboard'))
@@ -81,6 +84,7 @@ def handle_admin_login():
 def logout():
     user_type = session.get('user_type')
     
+    end_conversation(session)
     session.clear()
     flash('You have been logged out successfully', 'success')
     
@@ -1,5 +1,7 @@
 from app import db
 from datetime import datetime
+from sqlalchemy import inspect, text
+from cache import invalidate_on_commit
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class User(db.Model):
@@ -48,6 +50,18 @@ class Student(db.Model):
         db.UniqueConstraint('serial_no', 'roll_no', name='unique_student'),
     )
 
+class StudentInsight(db.Model):
+    """Precomputed progress summary for a student, refreshed by the precompute-insights command"""
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), unique=True, nullable=False)
+    data_hash = db.Column(db.String(64), nullable=False)  # hash of the student fields the summary used
+    gpa_trend = db.Column(db.Float)  # GPA change per semester
+    attendance_percentage = db.Column(db.Float)
+    major_percentile = db.Column(db.Float)  # GPA percentile within the student's major
+    summary = db.Column(db.Text, nullable=False)
+    llm_summary = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class UploadedFile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
@@ -55,6 +69,18 @@ class UploadedFile(db.Model):
     file_type = db.Column(db.String(10), nullable=False)  # 'csv' or 'pdf'
     uploaded_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    content_hash = db.Column(db.String(64), index=True)  # links to StoredFile
+
+class StoredFile(db.Model):
+    """Uploaded content stored once under its SHA-256 hash"""
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    file_type = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.Integer)
+    extracted_text = db.Column(db.Text)  # cached PDF text
+    imported_at = db.Column(db.DateTime)  # set once a CSV has been imported
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class ChatLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -62,7 +88,11 @@ class ChatLog(db.Model):
     user_id = db.Column(db.Integer)  # student serial_no or admin id
     query = db.Column(db.Text, nullable=False)
     response = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.Index('ix_chat_log_user', 'user_type', 'user_id'),
+    )
 
     def to_dict(self):
         return {
@@ -73,3 +103,83 @@ class ChatLog(db.Model):
             'response': self.response,
             'timestamp': self.timestamp.strftime('%Y-%m-%d %H:%M:%S')
         }
+
+class ChatLogDailyStat(db.Model):
+    """Chat counts per day kept for logs that were moved to the archive"""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    user_type = db.Column(db.String(10), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('day', 'user_type', name='unique_chat_log_day'),
+    )
+
+class GenerationUsage(db.Model):
+    """Gemini usage per user and day, for accounting and token budgets"""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    user_type = db.Column(db.String(10), nullable=False)  # 'student', 'admin' or 'system' for batch jobs
+    user_id = db.Column(db.Integer, nullable=False)
+    requests = db.Column(db.Integer, nullable=False, default=0)  # generations sent to Gemini
+    input_tokens = db.Column(db.Integer, nullable=False, default=0)
+    output_tokens = db.Column(db.Integer, nullable=False, default=0)
+    latency_ms = db.Column(db.Integer, nullable=False, default=0)  # summed over requests
+    degraded = db.Column(db.Integer, nullable=False, default=0)  # answers served without Gemini because of a budget
+    
+    __table_args__ = (
+        db.UniqueConstraint('day', 'user_type', 'user_id', name='unique_generation_usage'),
+    )
+
+class ReportJob(db.Model):
+    """A bulk report generation run; progress is checkpointed in ReportItem rows"""
+    id = db.Column(db.Integer, primary_key=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    selector = db.Column(db.Text, nullable=False)  # JSON student selector
+    template = db.Column(db.Text, nullable=False)  # report instructions
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'completed', 'failed'
+    total = db.Column(db.Integer, default=0)
+    finished_count = db.Column(db.Integer, default=0)  # last sequence handed to a finished item
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ReportItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('report_job.id'), nullable=False, index=True)
+    student_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # 'pending', 'done' or 'failed'
+    content = db.Column(db.Text)
+    finished_at = db.Column(db.DateTime)
+    sequence = db.Column(db.Integer)  # order in which items finished, used as the stream cursor
+    
+    __table_args__ = (
+        db.UniqueConstraint('job_id', 'student_id', name='unique_report_item'),
+    )
+
+# Drop cached data in every worker when the underlying rows change
+invalidate_on_commit(Student, 'students', 'stats')
+invalidate_on_commit(UploadedFile, 'stats')
+invalidate_on_commit(StoredFile, 'documents')
+invalidate_on_commit(StudentInsight, 'insights')
+invalidate_on_commit(ChatLogDailyStat, 'stats')
+
+def add_missing_columns():
+    """Add columns that were introduced after a table was first created.
+
+    db.create_all() only creates missing tables, so existing databases
+    would otherwise never see new nullable columns or their indexes.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = inspector.get_table_names()
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
@@ -0,0 +1,129 @@
+import os
+import logging
+import pdfplumber
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from threading import Lock
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+# Defaults used when no Flask config is available
+DEFAULT_WORKERS = os.cpu_count() or 2
+DEFAULT_PAGE_TIMEOUT = 10  # seconds
+
+# Shared process pool, created lazily on first use
+_executor = None
+_executor_workers = None
+_executor_lock = Lock()
+
+# Per-process cache of the last opened document, so a worker handling
+# several pages of the same PDF only parses the file structure once
+_worker_document = {'key': None, 'pdf': None}
+
+
+def _get_executor(workers):
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = ProcessPoolExecutor(max_workers=workers)
+            _executor_workers = workers
+        return _executor
+
+
+def _reset_executor():
+    """Kill the shared pool's workers after a page hung, so the next call starts fresh.
+
+    shutdown() alone never stops a worker stuck inside a page, so the
+    processes are terminated. Pages of other documents still running in
+    the pool fail and are skipped like any other unreadable page.
+    """
+    global _executor, _executor_workers
+    with _executor_lock:
+        executor = _executor
+        _executor = None
+        _executor_workers = None
+    if executor is None:
+        return
+
+    processes = list((getattr(executor, '_processes', None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+
+
+def _open_document(file_path):
+    key = (file_path, os.path.getmtime(file_path))
+    if _worker_document['key'] != key:
+        if _worker_document['pdf'] is not None:
+            try:
+                _worker_document['pdf'].close()
+            except Exception:
+                pass
+        _worker_document['pdf'] = pdfplumber.open(file_path)
+        _worker_document['key'] = key
+    return _worker_document['pdf']
+
+
+def _extract_page(file_path, page_number):
+    """Extract the text of a single page. Runs inside a pool worker."""
+    try:
+        pdf = _open_document(file_path)
+        return pdf.pages[page_number].extract_text() or ""
+    except Exception as e:
+        logger.error(f"Error extracting page {page_number + 1} of {file_path}: {str(e)}")
+        return None
+
+
+def _count_pages(file_path):
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pdf_text(file_path, workers=None, page_timeout=None):
+    """Extract the text of a PDF, splitting its pages across a process pool.
+
+    Returns the text of the pages joined in page order and the number of
+    pages skipped. A page that fails to parse or does not finish within
+    ``page_timeout`` seconds is skipped instead of failing the whole
+    document; callers should not keep an incomplete text for good, since
+    the page may well succeed on a later attempt. Every page runs in the
+    pool, even for a single worker, so a hung page can always be stopped.
+    """
+    workers = max(1, workers or DEFAULT_WORKERS)
+    page_timeout = page_timeout or DEFAULT_PAGE_TIMEOUT
+
+    page_count = _count_pages(file_path)
+
+    executor = _get_executor(workers)
+    futures = [executor.submit(_extract_page, file_path, page_number) for page_number in range(page_count)]
+
+    pages = []
+    timed_out = False
+    for page_number, future in enumerate(futures):
+        try:
+            pages.append(future.result(timeout=page_timeout))
+        except FutureTimeoutError:
+            logger.warning(f"Timed out extracting page {page_number + 1} of {file_path}, skipping")
+            future.cancel()
+            timed_out = True
+            pages.append(None)
+        except Exception as e:
+            logger.error(f"Error extracting page {page_number + 1} of {file_path}: {str(e)}")
+            pages.append(None)
+
+    if timed_out:
+        # A stuck worker would otherwise keep running and hold a slot in the shared pool
+        _reset_executor()
+
+    skipped = sum(1 for text in pages if text is None)
+    if skipped:
+        logger.warning(f"Skipped {skipped} of {page_count} pages in {file_path}")
+
+    return "\n".join(text for text in pages if text is not None), skipped
@@ -0,0 +1,341 @@
+import re
+import json
+import time
+import zipfile
+import logging
+import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, request, session, jsonify, current_app, send_file, url_for
+from models import db, Student, ReportJob, ReportItem
+from admin import admin_required
+from http_cache import conditional_get
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+# Create blueprint
+reports_bp = Blueprint('reports', __name__)
+
+# Built-in report templates; a request may instead pass its own "instructions"
+REPORT_TEMPLATES = {
+    'progress': "Write a progress report covering the student's semester-by-semester results, "
+                "GPA trend, current GPA, attendance and two or three concrete recommendations.",
+    'attendance': "Write an attendance report stating days present, days absent and the attendance "
+                  "percentage, whether it meets the 70% requirement, and what the student should do next.",
+    'parent_letter': "Write a short, polite letter to the student's parents summarising their academic "
+                     "progress and attendance this year.",
+}
+
+# A pending or running job whose heartbeat is older than this is treated as interrupted
+STALE_JOB_AFTER = datetime.timedelta(minutes=5)
+
+# Most reports returned by one stream request
+STREAM_BATCH_SIZE = 100
+
+# Jobs executing in this process
+_running_jobs = set()
+_running_lock = threading.Lock()
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls evenly at a fixed rate per minute"""
+
+    def __init__(self, rate_per_minute):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute else 0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def select_students(selector):
+    """Return the ids of students matching a selector of major, GPA range and/or roll numbers"""
+    query = db.session.query(Student.id)
+    if selector.get('major'):
+        query = query.filter(Student.major == selector['major'])
+    if selector.get('gpa_min') is not None:
+        query = query.filter(Student.current_gpa >= float(selector['gpa_min']))
+    if selector.get('gpa_max') is not None:
+        query = query.filter(Student.current_gpa <= float(selector['gpa_max']))
+    if selector.get('roll_nos'):
+        query = query.filter(Student.roll_no.in_([str(roll_no) for roll_no in selector['roll_nos']]))
+    return [row.id for row in query.order_by(Student.id)]
+
+
+def build_report_prompt(template, student):
+    return f"""
+    You are an administrative assistant for Dr. Mahalingam College of Engineering and Technology.
+    Write a report about the following student for the college staff.
+
+    Report instructions: {template}
+
+    Student Information:
+    Name: {student['name']}
+    Roll Number: {student['roll_no']}
+    Serial Number: {student['serial_no']}
+    Major: {student['major']}
+    Current GPA: {student['current_gpa']}
+    Attendance: {student['days_present']} days present out of {student['total_days']} total days
+    Courses: {student['courses']}
+
+    Semester Results:
+    Semester 1: {student['sem1']}
+    Semester 2: {student['sem2']}
+    Semester 3: {student['sem3']}
+    Semester 4: {student['sem4']}
+    Semester 5: {student['sem5']}
+    Semester 6: {student['sem6']}
+
+    Use markdown formatting. Base the report ONLY on the information provided.
+    """
+
+
+def job_to_dict(job):
+    counts = dict(db.session.query(ReportItem.status, db.func.count(ReportItem.id))
+                  .filter(ReportItem.job_id == job.id).group_by(ReportItem.status).all())
+    return {
+        'id': job.id,
+        'status': job.status,
+        'total': job.total,
+        'done': counts.get('done', 0),
+        'failed': counts.get('failed', 0),
+        'pending': counts.get('pending', 0),
+        'resumable': is_resumable(job),
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'stream_url': url_for('reports.stream_report', job_id=job.id),
+        'archive_url': url_for('reports.download_report', job_id=job.id),
+    }
+
+
+def is_resumable(job):
+    if job.id in _running_jobs:
+        return False
+    if job.status in ('pending', 'running'):
+        # Whichever process owns it has stopped sending heartbeats
+        return job.updated_at < datetime.datetime.utcnow() - STALE_JOB_AFTER
+    return job.status == 'failed'
+
+
+def start_job(job_id):
+    """Run a job's unfinished items in a background thread of this process"""
+    with _running_lock:
+        if job_id in _running_jobs:
+            return False
+        _running_jobs.add(job_id)
+    app = current_app._get_current_object()
+    threading.Thread(target=run_job, args=(app, job_id), daemon=True).start()
+    return True
+
+
+def run_job(app, job_id):
+    try:
+        with app.app_context():
+            job = db.session.get(ReportJob, job_id)
+            job.status = 'running'
+            db.session.commit()
+
+            # Finished items are checkpoints; only the rest are generated
+            pending = db.session.query(ReportItem.id, ReportItem.student_id).filter(
+                ReportItem.job_id == job_id, ReportItem.status != 'done'
+            ).all()
+            template = job.template
+            # Reports are charged to the admin who created the job, but only the global budget
+            # applies to them; a bulk job would otherwise exhaust that admin's own chat budget
+            user = ('admin', job.created_by)
+            limiter = RateLimiter(app.config['REPORT_RATE_PER_MINUTE'])
+
+            with ThreadPoolExecutor(max_workers=app.config['REPORT_WORKERS']) as pool:
+                results = list(pool.map(
+                    lambda item: generate_item(app, job_id, item.id, item.student_id, template, limiter, user), pending
+                ))
+
+            job = db.session.get(ReportJob, job_id)
+            job.status = 'completed' if all(results) else 'failed'
+            db.session.commit()
+            logger.info(f"Report job {job_id} finished: {sum(results)} of {len(results)} reports generated")
+    except Exception as e:
+        logger.error(f"Report job {job_id} failed: {str(e)}")
+        with app.app_context():
+            db.session.rollback()
+            db.session.query(ReportJob).filter(ReportJob.id == job_id).update({'status': 'failed'})
+            db.session.commit()
+    finally:
+        with _running_lock:
+            _running_jobs.discard(job_id)
+
+
+def generate_item(app, job_id, item_id, student_id, template, limiter, user):
+    # Import here to avoid circular imports
+    from chatbot import generate_response, get_student_snapshot, FALLBACK_MESSAGES
+
+    with app.app_context():
+        try:
+            item = db.session.get(ReportItem, item_id)
+            student = get_student_snapshot(student_id)
+            if student is None:
+                item.status = 'failed'
+                item.content = 'Student no longer exists.'
+            else:
+                limiter.acquire()
+                text = generate_response(build_report_prompt(template, student), user=user, user_checked=True)
+                item.status = 'failed' if text in FALLBACK_MESSAGES else 'done'
+                item.content = text
+            item.finished_at = datetime.datetime.utcnow()
+
+            # Checkpoint the item and refresh the job heartbeat. The job row stays locked until
+            # the commit, so sequence numbers follow commit order and stream cursors skip nothing.
+            db.session.query(ReportJob).filter(ReportJob.id == job_id).update({
+                'updated_at': item.finished_at,
+                'finished_count': db.func.coalesce(ReportJob.finished_count, 0) + 1,
+            })
+            item.sequence = db.session.query(ReportJob.finished_count).filter(ReportJob.id == job_id).scalar()
+            db.session.commit()
+            return item.status == 'done'
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error generating report item {item_id}: {str(e)}")
+            return False
+
+
+@reports_bp.route('/admin/reports', methods=['POST'])
+@admin_required
+def create_report():
+    data = request.get_json(silent=True) or {}
+    selector = data.get('selector') or {}
+    if not isinstance(selector, dict) or not any(selector.get(key) not in (None, '', []) for key in ('major', 'gpa_min', 'gpa_max', 'roll_nos')):
+        return jsonify({'error': 'Provide a selector with a major, gpa_min/gpa_max or roll_nos'}), 400
+
+    template = data.get('instructions') or REPORT_TEMPLATES.get(data.get('template', 'progress'))
+    if not template:
+        return jsonify({'error': f'Unknown template. Available templates: {", ".join(REPORT_TEMPLATES)}'}), 400
+
+    try:
+        student_ids = select_students(selector)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'gpa_min and gpa_max must be numbers'}), 400
+    if not student_ids:
+        return jsonify({'error': 'No students match the selector'}), 404
+
+    job = ReportJob()
+    job.created_by = session['user_id']
+    job.selector = json.dumps(selector)
+    job.template = template
+    job.total = len(student_ids)
+    db.session.add(job)
+    db.session.flush()
+    db.session.add_all([ReportItem(job_id=job.id, student_id=student_id) for student_id in student_ids])
+    db.session.commit()
+
+    start_job(job.id)
+    return jsonify(job_to_dict(job)), 202
+
+
+@reports_bp.route('/admin/reports/<int:job_id>', methods=['GET'])
+@admin_required
+@conditional_get
+def report_status(job_id):
+    job = db.session.get(ReportJob, job_id)
+    if not job:
+        return jsonify({'error': 'Report job not found'}), 404
+    return jsonify(job_to_dict(job))
+
+
+@reports_bp.route('/admin/reports/<int:job_id>/resume', methods=['POST'])
+@admin_required
+def resume_report(job_id):
+    job = db.session.get(ReportJob, job_id)
+    if not job:
+        return jsonify({'error': 'Report job not found'}), 404
+    if not is_resumable(job):
+        return jsonify({'error': f'Report job is {job.status} and cannot be resumed'}), 409
+
+    start_job(job.id)
+    return jsonify(job_to_dict(job)), 202
+
+
+@reports_bp.route('/admin/reports/<int:job_id>/stream', methods=['GET'])
+@admin_required
+def stream_report(job_id):
+    """Return reports finished after the ?after= cursor as newline-delimited JSON.
+
+    The last line holds the job status, the cursor for the next request
+    and whether the job is finished. Clients poll with that cursor until
+    finished is true, so no request is held open while the job runs.
+    """
+    job = db.session.get(ReportJob, job_id)
+    if not job:
+        return jsonify({'error': 'Report job not found'}), 404
+    try:
+        after = max(int(request.args.get('after', 0)), 0)
+    except ValueError:
+        return jsonify({'error': 'after must be a number'}), 400
+
+    query = db.session.query(ReportItem, Student.roll_no, Student.name).outerjoin(
+        Student, Student.id == ReportItem.student_id
+    ).filter(ReportItem.job_id == job_id, ReportItem.status == 'done')
+    if after:
+        query = query.filter(ReportItem.sequence > after)
+    else:
+        # Items finished before sequences were recorded have none
+        query = query.filter(db.or_(ReportItem.sequence > 0, ReportItem.sequence.is_(None)))
+    items = query.order_by(ReportItem.sequence, ReportItem.id).limit(STREAM_BATCH_SIZE + 1).all()
+    more = len(items) > STREAM_BATCH_SIZE
+    items = items[:STREAM_BATCH_SIZE]
+
+    cursor = after
+    lines = []
+    for item, roll_no, name in items:
+        cursor = max(cursor, item.sequence or 0)
+        lines.append(json.dumps({
+            'student_id': item.student_id,
+            'roll_no': roll_no,
+            'name': name,
+            'report': item.content,
+        }))
+    finished = not more and (job.status in ('completed', 'failed') or is_resumable(job))
+    lines.append(json.dumps({'job': job_to_dict(job), 'cursor': cursor, 'finished': finished}))
+
+    return current_app.response_class("\n".join(lines) + "\n", mimetype='application/x-ndjson')
+
+
+@reports_bp.route('/admin/reports/<int:job_id>/archive', methods=['GET'])
+@admin_required
+def download_report(job_id):
+    """Download every finished report of a job as a zip archive"""
+    job = db.session.get(ReportJob, job_id)
+    if not job:
+        return jsonify({'error': 'Report job not found'}), 404
+
+    # Build the archive on disk so large classes do not sit in memory
+    archive = tempfile.TemporaryFile()
+    failed = []
+    with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+        items = db.session.query(ReportItem, Student.roll_no, Student.name).outerjoin(
+            Student, Student.id == ReportItem.student_id
+        ).filter(ReportItem.job_id == job_id).order_by(ReportItem.id).yield_per(100)
+
+        for item, roll_no, name in items:
+            if item.status != 'done':
+                failed.append(item.student_id)
+                continue
+            safe_name = re.sub(r'[^A-Za-z0-9]+', '_', name or 'student').strip('_')
+            zip_file.writestr(f"{roll_no or item.student_id}_{safe_name}.md", item.content)
+
+        zip_file.writestr('manifest.json', json.dumps({
+            'job': job_to_dict(job),
+            'selector': json.loads(job.selector),
+            'template': job.template,
+            'unfinished_student_ids': failed,
+        }, indent=2))
+    archive.seek(0)
+
+    return send_file(archive, mimetype='application/zip', as_attachment=True,
+                     download_name=f"report_job_{job_id}.zip")
@@ -0,0 +1,153 @@
+import os
+import gzip
+import json
+import logging
+import datetime
+import click
+from collections import defaultdict
+from flask import current_app
+from flask.cli import with_appcontext
+from models import db, ChatLog, ChatLogDailyStat
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+
+def partition_path(archive_folder, day):
+    """Archive file holding the chat logs of one day, e.g. 2025/01/2025-01-31.jsonl.gz"""
+    return os.path.join(archive_folder, f"{day:%Y}", f"{day:%m}", f"{day:%Y-%m-%d}.jsonl.gz")
+
+
+def archive_chat_logs(retention_days, archive_folder, batch_size=1000):
+    """Move chat logs older than retention_days into compressed daily archive files.
+
+    Logs are appended to their day's partition before they are deleted, and
+    their per-day counts are added to ChatLogDailyStat in the same commit.
+    If a run is interrupted between the two steps, a rerun may append a log
+    again; readers drop duplicates by id. Returns the number of archived logs.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+    archived = 0
+
+    while True:
+        logs = db.session.query(ChatLog).filter(ChatLog.timestamp < cutoff).order_by(
+            ChatLog.timestamp, ChatLog.id
+        ).limit(batch_size).all()
+        if not logs:
+            break
+
+        by_day = defaultdict(list)
+        for log in logs:
+            by_day[log.timestamp.date()].append(log)
+
+        for day, day_logs in by_day.items():
+            path = partition_path(archive_folder, day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Appending writes a new gzip member; gzip readers treat the file as one stream
+            with gzip.open(path, 'at', encoding='utf-8') as archive_file:
+                for log in day_logs:
+                    archive_file.write(json.dumps(log.to_dict()) + "\n")
+
+            counts = defaultdict(int)
+            for log in day_logs:
+                counts[log.user_type or 'unknown'] += 1
+            for user_type, count in counts.items():
+                stat = db.session.query(ChatLogDailyStat).filter(
+                    ChatLogDailyStat.day == day, ChatLogDailyStat.user_type == user_type
+                ).first()
+                if stat is None:
+                    stat = ChatLogDailyStat()
+                    stat.day = day
+                    stat.user_type = user_type
+                    stat.count = 0
+                    db.session.add(stat)
+                stat.count += count
+
+        db.session.query(ChatLog).filter(ChatLog.id.in_([log.id for log in logs])).delete(synchronize_session=False)
+        db.session.commit()
+        archived += len(logs)
+
+    logger.info(f"Archived {archived} chat logs older than {retention_days} days")
+    return archived
+
+
+def compact_database():
+    """Reclaim the space freed by archived rows"""
+    dialect = db.engine.dialect.name
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        if dialect == 'sqlite':
+            connection.exec_driver_sql('VACUUM')
+        elif dialect == 'postgresql':
+            connection.exec_driver_sql('VACUUM ANALYZE chat_log')
+        else:
+            logger.warning(f"No compaction available for {dialect}")
+            return False
+    logger.info("Compacted the database")
+    return True
+
+
+def iter_archived_logs(archive_folder, start=None, end=None):
+    """Yield archived chat logs as dicts, oldest day first, within an optional inclusive date range"""
+    if not os.path.isdir(archive_folder):
+        return
+
+    for root, _, files in sorted(os.walk(archive_folder)):
+        for filename in sorted(files):
+            if not filename.endswith('.jsonl.gz'):
+                continue
+            try:
+                day = datetime.datetime.strptime(filename[:-len('.jsonl.gz')], '%Y-%m-%d').date()
+            except ValueError:
+                continue
+            if (start and day < start) or (end and day > end):
+                continue
+
+            seen = set()
+            with gzip.open(os.path.join(root, filename), 'rt', encoding='utf-8') as archive_file:
+                for line in archive_file:
+                    log = json.loads(line)
+                    if log['id'] in seen:
+                        continue
+                    seen.add(log['id'])
+                    yield log
+
+
+def search_archived_logs(archive_folder, text=None, start=None, end=None, user_type=None, user_id=None, limit=100):
+    """Case-insensitive search of archived queries and responses"""
+    needle = text.lower() if text else None
+    results = []
+    for log in iter_archived_logs(archive_folder, start, end):
+        if user_type and log['user_type'] != user_type:
+            continue
+        if user_id is not None and log['user_id'] != user_id:
+            continue
+        if needle and needle not in log['query'].lower() and needle not in log['response'].lower():
+            continue
+        results.append(log)
+        if len(results) >= limit:
+            break
+    return results
+
+
+def archived_chat_counts():
+    """Archived chat counts per user type and per day"""
+    stats = db.session.query(ChatLogDailyStat).all()
+    by_type = defaultdict(int)
+    by_day = defaultdict(int)
+    for stat in stats:
+        by_type[stat.user_type] += stat.count
+        by_day[stat.day.strftime('%Y-%m-%d')] += stat.count
+    return by_type, by_day
+
+
+@click.command('archive-chatlogs')
+@click.option('--days', default=None, type=int, help='Archive logs older than this many days.')
+@click.option('--no-compact', is_flag=True, help='Skip compacting the database afterwards.')
+@with_appcontext
+def archive_chatlogs_command(days, no_compact):
+    """Move old chat logs to the compressed archive and compact the database."""
+    days = days if days is not None else current_app.config['CHATLOG_RETENTION_DAYS']
+    count = archive_chat_logs(days, current_app.config['CHATLOG_ARCHIVE_FOLDER'])
+    if count and not no_compact:
+        compact_database()
+    click.echo(f"Archived {count} chat logs older than {days} days.")
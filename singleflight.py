@@ -0,0 +1,141 @@
+import time
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait and receive the same result (or exception).
+    Nothing is kept once the call finishes, so this is not a cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """Event-loop counterpart of SingleFlight for coroutine functions"""
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, coro_fn):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # Shield so one cancelled caller does not cancel the shared generation
+        return await asyncio.shield(task)
+
+
+class SharedFlight:
+    """Cross-worker single flight built on the shared cache.
+
+    The first caller for a key in any worker takes a lease (an atomic
+    counter in `lease_namespace`) and runs the generation; callers in other
+    workers poll `result_namespace` until the leader's result is cached.
+    If the lease expires or is released without a cached result, the
+    waiting callers run the work themselves.
+    """
+
+    def __init__(self, cache, lease_namespace, result_namespace, lease_ttl=60, poll_interval=0.25):
+        self.cache = cache
+        self.lease_namespace = lease_namespace
+        self.result_namespace = result_namespace
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+
+    def acquire(self, key):
+        count = self.cache.incr(self.lease_namespace, key, ttl=self.lease_ttl)
+        # Without a working cache every caller leads
+        return count is None or count == 1
+
+    def release(self, key):
+        self.cache.delete(self.lease_namespace, key)
+
+    def _poll(self, key):
+        """Return (finished, result) for the current state of another worker's lease"""
+        result = self.cache.get(self.result_namespace, key)
+        if result is not None:
+            return True, result
+        if self.cache.get(self.lease_namespace, key) is None:
+            return True, None
+        return False, None
+
+    def wait(self, key):
+        """Wait for the leader's result; None if it failed, expired or was not cached"""
+        deadline = time.monotonic() + self.lease_ttl
+        while time.monotonic() < deadline:
+            finished, result = self._poll(key)
+            if finished:
+                return result
+            time.sleep(self.poll_interval)
+        return None
+
+    async def wait_async(self, key):
+        # Cache reads may block on a locked SQLite file, so they stay off the event loop
+        deadline = time.monotonic() + self.lease_ttl
+        while time.monotonic() < deadline:
+            finished, result = await asyncio.to_thread(self._poll, key)
+            if finished:
+                return result
+            await asyncio.sleep(self.poll_interval)
+        return None
+
+    def do(self, key, fn):
+        if not self.acquire(key):
+            result = self.wait(key)
+            if result is not None:
+                return result
+            return fn()
+        try:
+            return fn()
+        finally:
+            self.release(key)
+
+    async def do_async(self, key, coro_fn):
+        if not await asyncio.to_thread(self.acquire, key):
+            result = await self.wait_async(key)
+            if result is not None:
+                return result
+            return await coro_fn()
+        try:
+            return await coro_fn()
+        finally:
+            await asyncio.to_thread(self.release, key)
@@ -0,0 +1,168 @@
+import time
+import logging
+import datetime
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models import db, GenerationUsage
+from cache import cache
+
+# Initialize logging
+logger = logging.getLogger(__name__)
+
+# Rough characters per token, used when Gemini does not report token counts
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return max(1, len(text or '') // CHARS_PER_TOKEN)
+
+
+def token_counts(generation_response, prompt, text):
+    """Input and output token counts reported by Gemini, estimated when missing"""
+    metadata = getattr(generation_response, 'usage_metadata', None)
+    input_tokens = getattr(metadata, 'prompt_token_count', None) or estimate_tokens(prompt)
+    output_tokens = getattr(metadata, 'candidates_token_count', None) or estimate_tokens(text)
+    return input_tokens, output_tokens
+
+
+def tokens_used_today(user_type=None, user_id=None):
+    query = db.session.query(
+        db.func.coalesce(db.func.sum(GenerationUsage.input_tokens + GenerationUsage.output_tokens), 0)
+    ).filter(GenerationUsage.day == datetime.datetime.utcnow().date())
+    if user_type is not None:
+        query = query.filter(GenerationUsage.user_type == user_type, GenerationUsage.user_id == user_id)
+    return query.scalar()
+
+
+def over_rate(key, limit):
+    """Count a request in the current minute and report whether it exceeds the limit"""
+    if not limit:
+        return False
+    count = cache.incr('budget', f"{key}:{int(time.time() // 60)}", ttl=120)
+    # A broken cache should not block generation
+    return count is not None and count > limit
+
+
+def check_budget(user_type, user_id, prompt):
+    """Return why a generation would exceed a budget, or None if it may go ahead.
+
+    Token budgets are per UTC day and stored in GenerationUsage; request
+    rates are per minute and counted in the shared cache. A limit of 0
+    disables that budget.
+    """
+    return check_user_budget(user_type, user_id, prompt) or check_global_budget(prompt)
+
+
+def check_user_budget(user_type, user_id, prompt):
+    """The budgets of one user, see check_budget"""
+    config = current_app.config
+    try:
+        user_limit = config['GEMINI_USER_DAILY_TOKENS']
+        if user_limit and tokens_used_today(user_type, user_id) + estimate_tokens(prompt) > user_limit:
+            return 'user daily tokens'
+    except Exception as e:
+        logger.error(f"Error checking token budget: {str(e)}")
+
+    if over_rate(f"{user_type}:{user_id}", config['GEMINI_USER_REQUESTS_PER_MINUTE']):
+        return 'user request rate'
+    return None
+
+
+def check_global_budget(prompt):
+    """The budgets shared by all users, see check_budget"""
+    config = current_app.config
+    try:
+        global_limit = config['GEMINI_GLOBAL_DAILY_TOKENS']
+        if global_limit and tokens_used_today() + estimate_tokens(prompt) > global_limit:
+            return 'global daily tokens'
+    except Exception as e:
+        logger.error(f"Error checking token budget: {str(e)}")
+
+    if over_rate('global', config['GEMINI_GLOBAL_REQUESTS_PER_MINUTE']):
+        return 'global request rate'
+    return None
+
+
+def record_usage(user_type, user_id, requests=0, input_tokens=0, output_tokens=0, latency_ms=0, degraded=0):
+    """Add to the user's usage for today; accounting errors never fail the chat"""
+    day = datetime.datetime.utcnow().date()
+    increments = {
+        GenerationUsage.requests: GenerationUsage.requests + requests,
+        GenerationUsage.input_tokens: GenerationUsage.input_tokens + input_tokens,
+        GenerationUsage.output_tokens: GenerationUsage.output_tokens + output_tokens,
+        GenerationUsage.latency_ms: GenerationUsage.latency_ms + latency_ms,
+        GenerationUsage.degraded: GenerationUsage.degraded + degraded,
+    }
+
+    def update():
+        return db.session.query(GenerationUsage).filter(
+            GenerationUsage.day == day, GenerationUsage.user_type == user_type, GenerationUsage.user_id == user_id
+        ).update(increments, synchronize_session=False)
+
+    try:
+        if not update():
+            usage = GenerationUsage(day=day, user_type=user_type, user_id=user_id, requests=requests,
+                                    input_tokens=input_tokens, output_tokens=output_tokens,
+                                    latency_ms=latency_ms, degraded=degraded)
+            db.session.add(usage)
+            try:
+                db.session.commit()
+                return
+            except IntegrityError:
+                # Another worker created today's row first
+                db.session.rollback()
+                update()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error recording Gemini usage for {user_type} {user_id}: {str(e)}")
+
+
+def record_generation(user_type, user_id, prompt, generation_response, text, latency_ms):
+    input_tokens, output_tokens = token_counts(generation_response, prompt, text)
+    logger.info(f"Gemini generation for {user_type} {user_id}: {input_tokens} input tokens, "
+                f"{output_tokens} output tokens, {latency_ms} ms")
+    record_usage(user_type, user_id, requests=1, input_tokens=input_tokens,
+                 output_tokens=output_tokens, latency_ms=latency_ms)
+
+
+def usage_report(days=7):
+    """Daily totals and the heaviest users over the last `days` days"""
+    since = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+    totals = (
+        db.func.sum(GenerationUsage.requests),
+        db.func.sum(GenerationUsage.input_tokens),
+        db.func.sum(GenerationUsage.output_tokens),
+        db.func.sum(GenerationUsage.latency_ms),
+        db.func.sum(GenerationUsage.degraded),
+    )
+
+    def to_dict(requests, input_tokens, output_tokens, latency_ms, degraded):
+        return {
+            'requests': requests or 0,
+            'input_tokens': input_tokens or 0,
+            'output_tokens': output_tokens or 0,
+            'avg_latency_ms': round(latency_ms / requests) if requests else None,
+            'degraded': degraded or 0,
+        }
+
+    daily = db.session.query(GenerationUsage.day, *totals).filter(
+        GenerationUsage.day >= since
+    ).group_by(GenerationUsage.day).order_by(GenerationUsage.day.desc()).all()
+    users = db.session.query(GenerationUsage.user_type, GenerationUsage.user_id, *totals).filter(
+        GenerationUsage.day >= since
+    ).group_by(GenerationUsage.user_type, GenerationUsage.user_id).order_by(
+        db.func.sum(GenerationUsage.input_tokens + GenerationUsage.output_tokens).desc()
+    ).limit(20).all()
+
+    config = current_app.config
+    return {
+        'days': [{'day': row[0].strftime('%Y-%m-%d'), **to_dict(*row[1:])} for row in daily],
+        'top_users': [{'user_type': row[0], 'user_id': row[1], **to_dict(*row[2:])} for row in users],
+        'budgets': {
+            'user_requests_per_minute': config['GEMINI_USER_REQUESTS_PER_MINUTE'],
+            'global_requests_per_minute': config['GEMINI_GLOBAL_REQUESTS_PER_MINUTE'],
+            'user_daily_tokens': config['GEMINI_USER_DAILY_TOKENS'],
+            'global_daily_tokens': config['GEMINI_GLOBAL_DAILY_TOKENS'],
+        },
+    }